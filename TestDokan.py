@@ -1,21 +1,15 @@
 import dokanmount
-import os.path
-import tempfile
-from fs.osfs import OSFS
+import os
 from fs.memoryfs import MemoryFS
-from shutil import rmtree
-from six import b
-path = tempfile.mkdtemp()
-try:
-	#fs = OSFS(path)
-	fs = MemoryFS()
-	fs.create('test.txt')
-	fs.appendtext('test.txt', 'This is a test file', encoding=u'utf-8', errors=None, newline=u'')
-	fs.makedir("TestDir")
-	fs.create('TestDir/subtest.txt')
-	fs.appendtext('TestDir/subtest.txt', 'This is a test file in a subfolder', encoding=u'utf-8', errors=None, newline=u'')
-	flags = dokanmount.DOKAN_OPTION_DEBUG | dokanmount.DOKAN_OPTION_STDERR | dokanmount.DOKAN_OPTION_REMOVABLE
-	a = dokanmount.mount(fs, "Q:\\", foreground=True, numthreads=2, flags=flags)
-	#fs.close()
-finally:
-	rmtree(path)
\ No newline at end of file
+from test_fixtures import FIXTURES_WITH_SUBDIR, make_file, open_test_fs, populate
+with open_test_fs() as fs:
+	populate(fs, FIXTURES_WITH_SUBDIR)
+	make_file(fs, 'TestDir/large.bin', 8 << 20)
+	#  In-memory filesystems never block, so extra Dokan threads only add
+	#  lock contention; slower backends benefit from more threads.
+	numthreads = 1 if isinstance(fs, MemoryFS) else min(os.cpu_count() or 1, 8)
+	flags = 0
+	if os.environ.get("DOKAN_DEBUG"):
+		flags |= dokanmount.DOKAN_OPTION_DEBUG | dokanmount.DOKAN_OPTION_STDERR
+	numthreads = int(os.environ.get("DOKAN_IO_THREADS", numthreads))
+	a = dokanmount.mount(dokanmount.CachingFS(fs), "Q:\\", foreground=True, numthreads=numthreads, flags=flags)
\ No newline at end of file
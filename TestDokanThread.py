@@ -1,24 +1,45 @@
 import dokanmount
-import os.path
-import tempfile
-from fs.osfs import OSFS
+import os
+import sys
+import threading
+import time
 from fs.memoryfs import MemoryFS
-from shutil import rmtree
-from six import b
+from test_fixtures import FIXTURES_WITH_SUBDIR, open_test_fs, populate
 
-fs = MemoryFS()
-fs.create('test.txt')
-fs.appendtext('test.txt', 'This is a test file', encoding=u'utf-8', errors=None, newline=u'')
-fs.makedir("TestDir")
-fs.create('TestDir/subtest.txt')
-fs.appendtext('TestDir/subtest.txt', 'This is a test file in a subfolder', encoding=u'utf-8', errors=None, newline=u'')
-#flags = dokanmount.DOKAN_OPTION_DEBUG | dokanmount.DOKAN_OPTION_STDERR | dokanmount.DOKAN_OPTION_REMOVABLE
-flags = dokanmount.DOKAN_OPTION_REMOVABLE
-dm = dokanmount.mount(fs, "Q:\\", foreground=False, numthreads=2, flags=flags)
-print ("Memory FS is now mounted!")
-input("Press any key to create file...")
-fs.create('PostMountCreatedFile.txt')
-fs.appendtext('PostMountCreatedFile.txt', 'This is a file was populated after Dokan mounted', encoding=u'utf-8', errors=None, newline=u'')
-print("You may need to refresh folder for the file to show up")
-input("Press any key to unmount drive...")
-dm.unmount()
\ No newline at end of file
+with open_test_fs() as fs:
+	populate(fs, FIXTURES_WITH_SUBDIR)
+	#  In-memory filesystems never block, so extra Dokan threads only add
+	#  lock contention; slower backends benefit from more threads.
+	numthreads = 1 if isinstance(fs, MemoryFS) else min(os.cpu_count() or 1, 8)
+	flags = 0
+	if os.environ.get("DOKAN_DEBUG"):
+		flags |= dokanmount.DOKAN_OPTION_DEBUG | dokanmount.DOKAN_OPTION_STDERR
+	numthreads = int(os.environ.get("DOKAN_IO_THREADS", numthreads))
+	#  mount() returns as soon as the Dokan thread starts; wait until Q: is
+	#  actually up before using or unmounting it.
+	mounted = threading.Event()
+	dm = dokanmount.mount(dokanmount.CachingFS(fs), "Q:\\", foreground=False, numthreads=numthreads, flags=flags, ready_callback=mounted.set)
+	if not mounted.wait(dokanmount.MountProcess.ready_timeout + 1.0):
+		raise OSError("Q: did not come up")
+	print ("Memory FS is now mounted!")
+	if "--interactive" in sys.argv[1:]:
+		input("Press any key to create file...")
+		fs.writebytes('PostMountCreatedFile.txt', b'This is a file was populated after Dokan mounted')
+		print("You may need to refresh folder for the file to show up")
+		input("Press any key to unmount drive...")
+	else:
+		#  Populate the filesystem through the mounted drive from a background
+		#  thread, so every write goes through Dokan and CachingFS, then
+		#  unmount as soon as the writer is done.
+		def writer(count=1000, size=4096):
+			payload = b"\0" * size
+			for i in range(count):
+				with open('Q:\\f%d.txt' % (i,), 'wb') as f:
+					f.write(payload)
+		start = time.time()
+		t = threading.Thread(target=writer)
+		t.start()
+		t.join()
+		print("Post-mount writes finished in %.3f seconds" % (time.time() - start))
+	dm.unmount()
+	dm.join()
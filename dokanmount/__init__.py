@@ -28,23 +28,21 @@ and exposes the given FS as that path::
 	'C:\\test'
 	>>> mp.unmount()
 
-The above spawns a new background process to manage the Dokan event loop, which
-can be controlled through the returned subprocess.Popen object.  To avoid
-spawning a new process, set the 'foreground' option::
+The above starts a background thread running the Dokan event loop, which
+can be controlled through the returned MountProcess object.  To run the
+event loop in the calling thread instead, set the 'foreground' option::
 
 	>>> #  This will block until the filesystem is unmounted
 	>>> dokan.mount(fs, "Q:\\", foreground=True)
 
-Any additional options for the Dokan process can be passed as keyword arguments
+Any additional options for the Dokan mount can be passed as keyword arguments
 to the 'mount' function.
 
-If you require finer control over the creation of the Dokan process, you can
-instantiate the MountProcess class directly.  It accepts all options available
-to subprocess.Popen::
+If you require finer control over the mount thread, you can instantiate the
+MountProcess class directly and start it yourself::
 
-	>>> from subprocess import PIPE
-	>>> mp = dokan.MountProcess(fs, "Q:\\", stderr=PIPE)
-	>>> dokan_errors = mp.communicate()[1]
+	>>> mp = dokan.MountProcess(fs, "Q:\\", numthreads=4)
+	>>> mp.start()
 
 
 If you are exposing an untrusted filesystem, you may like to apply the
@@ -61,31 +59,30 @@ systems with Dokan installed.
 #  Copyright (c) 2016-2016, Adrien J. <liryna.stark@gmail.com>.
 #  All rights reserved; available under the terms of the MIT License.
 
+import bisect
 import ctypes
 import datetime
 import errno
+import heapq
+import inspect
+import io
+import itertools
 import logging
 import os
-import stat as statinfo
-from multiprocessing import Process
-import subprocess
 import sys
 import threading
 import time
-from collections import deque
-from functools import wraps
-
-import six
-from fs.errors import FSError, ResourceInvalid, Unsupported
-from fs.path import basename, combine, join, normpath, recursepath, relpath
+import weakref
+from collections import OrderedDict
+from functools import lru_cache, wraps
+
+from fs.errors import FSError, ResourceInvalid, ResourceNotFound, Unsupported
+from fs.mode import Mode
+from fs.path import (abspath, basename, combine, dirname, join, normpath,
+                     relpath)
 from fs.wrapfs import WrapFS
 
-from fs_legacy import PathMap, convert_fs_errors
-
-try:
-	import cPickle as pickle
-except ImportError:
-	import pickle
+from fs_legacy import fserror2errno
 
 try:
 	import dokanmount.libdokan
@@ -266,7 +263,12 @@ MinimumFileHandler = 100
 _TIMEOUT_PROTECT_THREAD = None
 _TIMEOUT_PROTECT_LOCK = threading.Lock()
 _TIMEOUT_PROTECT_COND = threading.Condition(_TIMEOUT_PROTECT_LOCK)
-_TIMEOUT_PROTECT_QUEUE = deque()
+#  Heap of (deadline, seq, info_addr, info) ordered by deadline, and the
+#  sequence number of the call currently running for each DokanFileInfo.
+#  Heap entries whose seq no longer matches are stale and simply dropped.
+_TIMEOUT_PROTECT_HEAP = []
+_TIMEOUT_PROTECT_ACTIVE = {}
+_TIMEOUT_PROTECT_SEQ = itertools.count()
 _TIMEOUT_PROTECT_WAIT_TIME = 4 * 60
 _TIMEOUT_PROTECT_RESET_TIME = 5 * 60 * 1000
 
@@ -288,74 +290,198 @@ def _start_timeout_protect_thread():
 
 
 def _run_timeout_protect_thread():
-	while True:
-		with _TIMEOUT_PROTECT_COND:
-			try:
-				(when, info, finished) = _TIMEOUT_PROTECT_QUEUE.popleft()
-			except IndexError:
+	heap = _TIMEOUT_PROTECT_HEAP
+	active = _TIMEOUT_PROTECT_ACTIVE
+	rearm = []
+	with _TIMEOUT_PROTECT_COND:
+		while True:
+			#  Handle every entry that is due or stale in a single pass, so
+			#  that a wakeup resets all the calls that need it at once.
+			now = time.time()
+			while heap:
+				(deadline, seq, addr, info) = heap[0]
+				if active.get(addr) != seq:
+					heapq.heappop(heap)
+				elif deadline <= now:
+					heapq.heappop(heap)
+					libdokan.DokanResetTimeout(_TIMEOUT_PROTECT_RESET_TIME, info)
+					rearm.append((now + _TIMEOUT_PROTECT_WAIT_TIME, seq, addr, info))
+				else:
+					break
+			for entry in rearm:
+				heapq.heappush(heap, entry)
+			del rearm[:]
+			if heap:
+				_TIMEOUT_PROTECT_COND.wait(heap[0][0] - now)
+			else:
 				_TIMEOUT_PROTECT_COND.wait()
-				continue
-		if finished:
-			continue
-		now = time.time()
-		wait_time = max(0, _TIMEOUT_PROTECT_WAIT_TIME - now + when)
-		time.sleep(wait_time)
-		with _TIMEOUT_PROTECT_LOCK:
-			if finished:
-				continue
-			libdokan.DokanResetTimeout(_TIMEOUT_PROTECT_RESET_TIME, info)
-			_TIMEOUT_PROTECT_QUEUE.append((now + wait_time, info, finished))
+
+
+def _timeout_protect_finish(addr):
+	"""Stop monitoring the call running for the DokanFileInfo at addr."""
+	heap = _TIMEOUT_PROTECT_HEAP
+	with _TIMEOUT_PROTECT_LOCK:
+		del _TIMEOUT_PROTECT_ACTIVE[addr]
+		#  Finished calls leave their entry in the heap until it comes due,
+		#  so compact it once stale entries make up most of it.
+		if len(heap) > 2 * len(_TIMEOUT_PROTECT_ACTIVE) + 64:
+			active = _TIMEOUT_PROTECT_ACTIVE
+			heap[:] = [e for e in heap if active.get(e[2]) == e[1]]
+			heapq.heapify(heap)
+
+
+def _timeout_protect_start(info):
+	"""Start monitoring a call for the given DokanFileInfo pointer.
+
+	Returns the key to pass to _timeout_protect_finish once the call exits.
+	"""
+	if _TIMEOUT_PROTECT_THREAD is None:
+		_start_timeout_protect_thread()
+	addr = ctypes.addressof(info.contents)
+	deadline = time.time() + _TIMEOUT_PROTECT_WAIT_TIME
+	with _TIMEOUT_PROTECT_LOCK:
+		seq = next(_TIMEOUT_PROTECT_SEQ)
+		_TIMEOUT_PROTECT_ACTIVE[addr] = seq
+		heapq.heappush(_TIMEOUT_PROTECT_HEAP, (deadline, seq, addr, info))
+		if len(_TIMEOUT_PROTECT_HEAP) == 1:
+			_TIMEOUT_PROTECT_COND.notify()
+	return addr
+
+
+#  Source templates for the Dokan callback wrappers.  They are filled in
+#  with the exact parameter list of the wrapped method, so that calls don't
+#  go through *args packing and unpacking.
+_DOKAN_CB_TEMPLATE = """
+def make(function):
+	def wrapper({params}):
+		try:
+			return function({params}) or 0
+		except FSError as e:
+			return _errno2syserrcode(fserror2errno(e))
+		except OSError as e:
+			if e.errno:
+				return _errno2syserrcode(e.errno)
+			return STATUS_ACCESS_DENIED
+	return wrapper
+"""
+
+#  Unregistering in the finally clause, under the lock, guarantees that the
+#  timeout of a call is never reset after its DokanFileInfo has gone away.
+_DOKAN_CB_TIMEOUT_TEMPLATE = """
+def make(function):
+	def wrapper({params}):
+		addr = _timeout_protect_start({info})
+		try:
+			return function({params}) or 0
+		except FSError as e:
+			return _errno2syserrcode(fserror2errno(e))
+		except OSError as e:
+			if e.errno:
+				return _errno2syserrcode(e.errno)
+			return STATUS_ACCESS_DENIED
+		finally:
+			_timeout_protect_finish(addr)
+	return wrapper
+"""
+
+_DOKAN_CB_MAKERS = {}
+
+
+def _make_dokan_cb(function, needs_timeout):
+	"""Build the single wrapper through which Dokan calls a method.
+
+	The wrapper translates FS errors into win32 status codes and returns
+	zero instead of None.  If needs_timeout is true it also registers the
+	call with the timeout protect thread while it runs.  Doing all of this
+	in one function keeps each callback down to a single extra frame.
+
+	The wrapper is generated with the same signature as the method; the
+	generated code is cached per signature.
+	"""
+	params = tuple(inspect.signature(function).parameters)
+	key = (params, needs_timeout)
+	try:
+		make = _DOKAN_CB_MAKERS[key]
+	except KeyError:
+		if needs_timeout:
+			template = _DOKAN_CB_TIMEOUT_TEMPLATE
+		else:
+			template = _DOKAN_CB_TEMPLATE
+		src = template.format(params=", ".join(params), info=params[-1])
+		namespace = {}
+		exec(src, globals(), namespace)
+		make = _DOKAN_CB_MAKERS[key] = namespace["make"]
+	wrapper = wraps(function)(make(function))
+	if not needs_timeout:
+		wrapper._dokan_function = function
+	return wrapper
 
 
 def timeout_protect(func):
 	"""Method decorator to enable timeout protection during call.
 
-	This decorator adds an entry to the timeout protect queue before executing
-	the function, and marks it as finished when the function exits.
+	This decorator registers the call with the timeout protect thread before
+	executing the function, and unregisters it when the function exits.
+	Applied on top of handle_fs_errors, the two are merged into a single
+	wrapper.
 	"""
+	function = getattr(func, "_dokan_function", None)
+	if function is not None:
+		return _make_dokan_cb(function, True)
+
 	@wraps(func)
-	def wrapper(self, *args):
-		if _TIMEOUT_PROTECT_THREAD is None:
-			_start_timeout_protect_thread()
-		info = args[-1]
-		finished = []
+	def wrapper(*args):
+		addr = _timeout_protect_start(args[-1])
 		try:
-			with _TIMEOUT_PROTECT_COND:
-				_TIMEOUT_PROTECT_QUEUE.append((time.time(), info, finished))
-				_TIMEOUT_PROTECT_COND.notify()
-			return func(self, *args)
+			return func(*args)
 		finally:
-			with _TIMEOUT_PROTECT_LOCK:
-				finished.append(True)
+			_timeout_protect_finish(addr)
 	return wrapper
 
 
 def handle_fs_errors(function):
 	"""Method decorator to report FS errors in the appropriate way.
 
-	This decorator catches all FS errors and translates them into an
-	equivalent OSError, then returns the negated error number.  It also
-	makes the function return zero instead of None as an indication of
-	successful execution.
+	This decorator catches all FS errors and translates them into the
+	equivalent win32 status code.  It also makes the function return zero
+	instead of None as an indication of successful execution.
 	"""
-	function = convert_fs_errors(function)
+	return _make_dokan_cb(function, False)
 
-	@wraps(function)
-	def wrapper(*args, **kwds):
-		try:
-			response = function(*args, **kwds)
-		except OSError as e:
-			if e.errno:
-				response = _errno2syserrcode(e.errno)
-			else:
-				response = STATUS_ACCESS_DENIED
-		except Exception as e:
-			raise
-		else:
-			if response is None:
-				response = 0
-		return response
-	return wrapper
+
+class _NullLock(object):
+	"""Lock stand-in used for file handles when Dokan runs single-threaded."""
+
+	def acquire(self, blocking=True, timeout=-1):
+		return True
+
+	def release(self):
+		pass
+
+	def __enter__(self):
+		return True
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		pass
+
+
+_NULL_LOCK = _NullLock()
+
+#  Standard io file objects are done with the data passed to write() by the
+#  time it returns, so they can be handed a view of Dokan's buffer.  Other
+#  files might hold on to it after the buffer has been released.
+_COPYING_FILE_TYPES = (io.RawIOBase, io.BufferedIOBase)
+
+
+@lru_cache(maxsize=4096)
+def _dokanpath2pyfs(FileName):
+	"""Convert a path received from Dokan into a normalized pyfs path.
+
+	Dokan hands the same path to every callback on an open file, so the
+	results are memoized.
+	"""
+	FileName = FileName.replace('\\', '/')
+	return normpath(FileName)
 
 
 class FSOperations(object):
@@ -369,6 +495,19 @@ class FSOperations(object):
 		self.fsname = fsname
 		self.volname = volname
 		self.securityfolder = securityfolder
+		#  Bind the methods used on the hot paths once, rather than looking
+		#  them up through self.fs on every callback.
+		self._fs_open = fs.open
+		self._fs_makedir = fs.makedir
+		self._fs_isdir = fs.isdir
+		self._fs_exists = fs.exists
+		self._fs_getinfo = fs.getinfo
+		self._fs_listdir = fs.listdir
+		self._fs_scandir = fs.scandir
+		self._memmove = ctypes.memmove
+		#  GetVolumeInformation is polled often; build the names only once.
+		self._fsname_buf = ctypes.create_unicode_buffer(fsname)
+		self._volname_buf = ctypes.create_unicode_buffer(volname)
 		self._files_by_handle = {}
 		self._files_lock = threading.Lock()
 		self._next_handle = MinimumFileHandler
@@ -377,13 +516,18 @@ class FSOperations(object):
 		#  until the handle is closed.  This set monitors pending deletes.
 		self._pending_delete = set()
 		#  Since pyfilesystem has no locking API, we manage file locks
-		#  in memory.  This maps paths to a list of current locks.
-		self._active_locks = PathMap()
+		#  in memory.  This maps paths to a list of current locks, each a
+		#  (start, end, handle) tuple, sorted by offset.
+		#  Paths are always normalized by _dokanpath2pyfs before they are
+		#  used as keys, so plain dicts are enough here.
+		self._active_locks = {}
 		#  Dokan expects a succesful write() to be reflected in the file's
 		#  reported size, but the FS might buffer writes and prevent this.
-		#  We explicitly keep track of the size Dokan expects a file to be.
-		#  This dict is indexed by path, then file handle.
-		self._files_size_written = PathMap()
+		#  We explicitly keep track of the size Dokan expects a file to be:
+		#  the largest size written through any of its open handles.  The
+		#  entry for a path is dropped once its last handle is closed.
+		self._max_size_written = {}
+		self._open_count = {}
 
 	def get_ops_struct(self):
 		"""Get a DOKAN_OPERATIONS struct mapping to our methods."""
@@ -399,17 +543,19 @@ class FSOperations(object):
 		except KeyError:
 			raise FSError("invalid file handle")
 
-	def _reg_file(self, File, FileName):
-		"""Register a new file handle for the given file and path."""
+	def _reg_file(self, File, FileName, single_threaded=False):
+		"""Register a new file handle for the given file and path.
+
+		If Dokan dispatches every callback from a single thread, no two
+		calls can touch the handle concurrently and it gets a no-op lock.
+		"""
 		self._files_lock.acquire()
 		try:
 			FileHandle = self._next_handle
 			self._next_handle += 1
-			lock = threading.Lock()
+			lock = _NULL_LOCK if single_threaded else threading.Lock()
 			self._files_by_handle[FileHandle] = (File, FileName, lock)
-			if FileName not in self._files_size_written:
-				self._files_size_written[FileName] = {}
-			self._files_size_written[FileName][FileHandle] = 0
+			self._open_count[FileName] = self._open_count.get(FileName, 0) + 1
 			return FileHandle
 		finally:
 			self._files_lock.release()
@@ -435,9 +581,12 @@ class FSOperations(object):
 		try:
 			#(f, path, lock) = self._files_by_handle.pop(fh)
 			path = self._files_by_handle.pop(FileHandle)[1]
-			del self._files_size_written[path][FileHandle]
-			if not self._files_size_written[path]:
-				del self._files_size_written[path]
+			count = self._open_count[path] - 1
+			if count:
+				self._open_count[path] = count
+			else:
+				del self._open_count[path]
+				self._max_size_written.pop(path, None)
 		finally:
 			self._files_lock.release()
 
@@ -447,31 +596,48 @@ class FSOperations(object):
 		This is true if the path or any of its parents have been marked
 		as pending deletion, false otherwise.
 		"""
-		for ppath in recursepath(FileName):
-			if ppath in self._pending_delete:
+		pending_delete = self._pending_delete
+		if not pending_delete:
+			return False
+		#  Walk up the path by slicing at each separator, stopping at the
+		#  first hit, rather than building the full list of ancestors.
+		path = FileName
+		while True:
+			if path in pending_delete:
 				return True
-		return False
+			i = path.rfind('/')
+			if i <= 0:
+				return i == 0 and path != '/' and '/' in pending_delete
+			path = path[:i]
 
-	def _check_lock(self, FileName, Offset, length, DokanFileInfo, locks=None):
+	def _check_lock(self, FileName, Offset, length, FileHandle, locks=None):
 		"""Check whether the given file range is locked.
 
 		This method implements basic lock checking.  It checks all the locks
 		held against the given file, and if any overlap the given byte range
 		then it returns STATUS_LOCK_NOT_GRANTED.  If the range is not locked, it will
-		return zero.
+		return zero.  Locks held by FileHandle itself are ignored.
 		"""
 		if locks is None:
+			#  Most files are never locked; don't take the mutex for them.
+			if not self._active_locks:
+				return STATUS_SUCCESS
 			with self._files_lock:
 				try:
 					locks = self._active_locks[FileName]
 				except KeyError:
 					return STATUS_SUCCESS
-		for (lh, lstart, lend) in locks:
-			if DokanFileInfo is not None and DokanFileInfo.contents.Context == lh:
-				continue
-			if lstart >= Offset + length:
-				continue
+		#  The locks on a file never overlap and are sorted by offset, so
+		#  only those starting before the end of the range and ending after
+		#  its start need to be looked at, and they form a single run.
+		end = Offset + length
+		i = bisect.bisect_left(locks, (end,))
+		while i > 0:
+			i -= 1
+			(lstart, lend, lh) = locks[i]
 			if lend <= Offset:
+				break
+			if FileHandle == lh:
 				continue
 			return STATUS_LOCK_NOT_GRANTED
 		return STATUS_SUCCESS
@@ -480,6 +646,7 @@ class FSOperations(object):
 	@handle_fs_errors
 	def ZwCreateFile(self, FileName, SecurityContext, DesiredAccess, FileAttributes, ShareAccess, CreateDisposition, CreateOptions, DokanFileInfo):
 		FileName = self._dokanpath2pyfs(FileName)
+		dfi = DokanFileInfo.contents
 		#  Can't open files that are pending delete.
 		if self._is_pending_delete(FileName):
 			return STATUS_ACCESS_DENIED
@@ -489,27 +656,36 @@ class FSOperations(object):
 				# From https://docs.microsoft.com/en-us/windows-hardware/drivers/ddi/content/wdm/nf-wdm-zwcreatefile
 				# Do not specify FILE_READ_DATA, FILE_WRITE_DATA, FILE_APPEND_DATA, or FILE_EXECUTE when you create or open a directory.
 				# If they are not defined we are opening or creating a Directory
-				DokanFileInfo.contents.IsDirectory = 0
+				dfi.IsDirectory = 0
+
+		#  A single getinfo answers both "does it exist" and "is it a
+		#  directory" for all the branches below.
+		try:
+			is_dir = self._fs_getinfo(FileName).is_dir
+		except ResourceNotFound:
+			exists = is_dir = False
+		else:
+			exists = True
 
 		retcode = STATUS_SUCCESS
-		if self.fs.isdir(FileName) or DokanFileInfo.contents.IsDirectory == 1:
-			DokanFileInfo.contents.IsDirectory = 1
+		if is_dir or dfi.IsDirectory == 1:
+			dfi.IsDirectory = 1
 			if CreateDisposition == FILE_OPEN:
-				if self.fs.exists(FileName):
+				if exists:
 					return STATUS_SUCCESS
 				else:
 					return FILE_DOES_NOT_EXIST
 
 			if CreateDisposition == FILE_CREATE:
-				if self.fs.makedir(FileName):
+				if self._fs_makedir(FileName):
 					return STATUS_SUCCESS
 				return FILE_DOES_NOT_EXIST
 
 			elif CreateDisposition == FILE_OPEN_IF:
-				if self.fs.exists(FileName):
+				if exists:
 					return STATUS_SUCCESS
 				else:
-					if self.fs.makedir(FileName):
+					if self._fs_makedir(FileName):
 						return STATUS_SUCCESS
 					return FILE_DOES_NOT_EXIST
 		else:
@@ -519,15 +695,15 @@ class FSOperations(object):
 				return FILE_DOES_NOT_EXIST
 			if CreateDisposition == FILE_OPEN:
 				mode = "r+b"
-				if not self.fs.exists(FileName):
+				if not exists:
 					return FILE_DOES_NOT_EXIST
 			elif CreateDisposition == FILE_CREATE:
 				mode = "w+b"
-				if self.fs.exists(FileName):
+				if exists:
 					return ERROR_ALREADY_EXISTS
 			elif CreateDisposition == FILE_OVERWRITE:
 				mode = "w+b"
-				if not self.fs.exists(FileName):
+				if not exists:
 					return FILE_DOES_NOT_EXIST
 			elif CreateDisposition == FILE_OVERWRITE_IF:
 				mode = "w+b"
@@ -541,13 +717,17 @@ class FSOperations(object):
 				mode = "r+b"
 
 			try:
-				f = self.fs.open(FileName, mode)
+				f = self._fs_open(FileName, mode)
 				#  print(path, mode, repr(f))
 			except FSError:
 					# print(e)
 					raise
 			else:
-				DokanFileInfo.contents.Context = self._reg_file(f, FileName)
+				#  "w+b" truncated the file, so earlier writes no longer count.
+				if mode == "w+b":
+					self._max_size_written.pop(FileName, None)
+				single_threaded = dfi.DokanOptions.contents.ThreadCount == 1
+				dfi.Context = self._reg_file(f, FileName, single_threaded)
 			if retcode == STATUS_SUCCESS and (CreateOptions & FILE_DELETE_ON_CLOSE):
 				self._pending_delete.add(FileName)
 		return retcode
@@ -556,55 +736,71 @@ class FSOperations(object):
 	@handle_fs_errors
 	def Cleanup(self, FileName, DokanFileInfo):
 		FileName = self._dokanpath2pyfs(FileName)
-		if DokanFileInfo.contents.IsDirectory:
-			if DokanFileInfo.contents.DeleteOnClose:
+		dfi = DokanFileInfo.contents
+		if dfi.IsDirectory:
+			if dfi.DeleteOnClose:
 				self.fs.removedir(FileName)
 				self._pending_delete.remove(FileName)
 		else:
-			(file, _, lock) = self._get_file(DokanFileInfo.contents.Context)
+			fh = dfi.Context
+			(file, _, lock) = self._get_file(fh)
 			lock.acquire()
 			try:
 				file.close()
-				if DokanFileInfo.contents.DeleteOnClose:
+				if dfi.DeleteOnClose:
 					self.fs.remove(FileName)
 					self._pending_delete.remove(FileName)
-					self._del_file(DokanFileInfo.contents.Context)
-					DokanFileInfo.contents.Context = 0
+					self._del_file(fh)
+					dfi.Context = 0
 			finally:
 				lock.release()
 
 	@timeout_protect
 	@handle_fs_errors
 	def CloseFile(self, FileName, DokanFileInfo):
-		if DokanFileInfo.contents.Context >= MinimumFileHandler:
-			(file, _, lock) = self._get_file(DokanFileInfo.contents.Context)
+		dfi = DokanFileInfo.contents
+		fh = dfi.Context
+		if fh >= MinimumFileHandler:
+			(file, _, lock) = self._get_file(fh)
 			lock.acquire()
 			try:
 				file.close()
-				self._del_file(DokanFileInfo.contents.Context)
+				self._del_file(fh)
 			finally:
 				lock.release()
-			DokanFileInfo.contents.Context = 0
+			dfi.Context = 0
 
 	@timeout_protect
 	@handle_fs_errors
 	def ReadFile(self, FileName, Buffer, BufferLength, ReadLength, Offset, DokanFileInfo):
-		FileName = self._dokanpath2pyfs(FileName)
-		(file, _, lock) = self._get_file(DokanFileInfo.contents.Context)
+		#  Dokan may pass a NULL Buffer along with a zero BufferLength.
+		if not BufferLength:
+			ReadLength[0] = 0
+			return STATUS_SUCCESS
+		#  The handle already records the normalized path it was opened with.
+		fh = DokanFileInfo.contents.Context
+		(file, FileName, lock) = self._get_file(fh)
 		lock.acquire()
 		try:
-			file_lock_status = self._check_lock(FileName, Offset, BufferLength, DokanFileInfo)
+			file_lock_status = self._check_lock(FileName, Offset, BufferLength, fh)
 			if file_lock_status:
 				return file_lock_status
 			#  This may be called after Cleanup, meaning we
 			#  need to re-open the file.
 			if file.closed:
-				file = self.fs.open(FileName, file.mode)
-				self._rereg_file(DokanFileInfo.contents.Context, file)
+				file = self._fs_open(FileName, file.mode)
+				self._rereg_file(fh, file)
 			file.seek(Offset)
-			data = file.read(BufferLength)
-			ctypes.memmove(Buffer, ctypes.create_string_buffer(data), len(data))
-			ReadLength[0] = len(data)
+			#  Read straight into the buffer supplied by Dokan if the file
+			#  supports it, otherwise copy the data over just once.
+			try:
+				view = (ctypes.c_ubyte * BufferLength).from_address(Buffer)
+				nread = file.readinto(view) or 0
+			except (AttributeError, io.UnsupportedOperation):
+				data = file.read(BufferLength)
+				nread = len(data)
+				self._memmove(Buffer, data, nread)
+			ReadLength[0] = nread
 		finally:
 			lock.release()
 		return STATUS_SUCCESS
@@ -612,36 +808,44 @@ class FSOperations(object):
 	@timeout_protect
 	@handle_fs_errors
 	def WriteFile(self, FileName, Buffer, NumberOfBytesToWrite, NumberOfBytesWritten, Offset, DokanFileInfo):
-		FileName = self._dokanpath2pyfs(FileName)
-		fh = DokanFileInfo.contents.Context
-		(file, _, lock) = self._get_file(fh)
+		#  Dokan may pass a NULL Buffer along with a zero length.
+		if not NumberOfBytesToWrite:
+			NumberOfBytesWritten[0] = 0
+			return STATUS_SUCCESS
+		dfi = DokanFileInfo.contents
+		fh = dfi.Context
+		(file, FileName, lock) = self._get_file(fh)
 		lock.acquire()
 		try:
-			file_lock_status = self._check_lock(FileName, Offset, NumberOfBytesToWrite, DokanFileInfo)
+			file_lock_status = self._check_lock(FileName, Offset, NumberOfBytesToWrite, fh)
 			if file_lock_status !=0:
 				return file_lock_status
 			#  This may be called after Cleanup, meaning we
 			#  need to re-open the file.
 			if file.closed:
 				print('reopenWriteFile')
-				file = self.fs.open(FileName, file.mode)
-				self._rereg_file(DokanFileInfo.contents.Context, file)
-			if DokanFileInfo.contents.WriteToEndOfFile:
+				file = self._fs_open(FileName, file.mode)
+				self._rereg_file(fh, file)
+			if dfi.WriteToEndOfFile:
 				file.seek(0, os.SEEK_END)
 			else:
 				file.seek(Offset)
-			data = ctypes.create_string_buffer(NumberOfBytesToWrite)
-			ctypes.memmove(data, Buffer, NumberOfBytesToWrite)
-			file.write(data.raw)
-			NumberOfBytesWritten[0] = len(data.raw)
-			try:
-				size_written = self._files_size_written[FileName][fh]
-			except KeyError:
-				pass
+			#  Hand io files a view of Dokan's buffer instead of a copy; any
+			#  other file, or one that insists on bytes, gets a single copy.
+			if isinstance(file, _COPYING_FILE_TYPES):
+				view = memoryview((ctypes.c_ubyte * NumberOfBytesToWrite).from_address(Buffer)).cast('B')
+				try:
+					written = file.write(view)
+				except TypeError:
+					written = file.write(view.tobytes())
 			else:
-				if Offset + NumberOfBytesWritten[0] > size_written:
-					new_size_written = Offset + NumberOfBytesWritten[0]
-					self._files_size_written[FileName][fh] = new_size_written
+				written = file.write(ctypes.string_at(Buffer, NumberOfBytesToWrite))
+			if written is None:
+				written = NumberOfBytesToWrite
+			NumberOfBytesWritten[0] = written
+			new_size_written = Offset + written
+			if new_size_written > self._max_size_written.get(FileName, 0):
+				self._max_size_written[FileName] = new_size_written
 		finally:
 			lock.release()
 		return STATUS_SUCCESS
@@ -649,7 +853,6 @@ class FSOperations(object):
 	@timeout_protect
 	@handle_fs_errors
 	def FlushFileBuffers(self, FileName, DokanFileInfo):
-		FileName = self._dokanpath2pyfs(FileName)
 		(file, _, lock) = self._get_file(DokanFileInfo.contents.Context)
 		lock.acquire()
 		try:
@@ -662,14 +865,11 @@ class FSOperations(object):
 	@handle_fs_errors
 	def GetFileInformation(self, FileName, Buffer, DokanFileInfo):
 		FileName = self._dokanpath2pyfs(FileName)
-		finfo = self.fs.getinfo(FileName,namespaces=['basic','details'])
+		finfo = self._fs_getinfo(FileName,namespaces=['basic','details'])
 		data = Buffer.contents
 		self._info2finddataw(FileName, finfo, data, DokanFileInfo)
-		try:
-			written_size = max(self._files_size_written[FileName].values())
-		except KeyError:
-			pass
-		else:
+		written_size = self._max_size_written.get(FileName)
+		if written_size is not None:
 			reported_size = (data.nFileSizeHigh << 32) + data.nFileSizeLow
 			if written_size > reported_size:
 				data.nFileSizeHigh = written_size >> 32
@@ -681,26 +881,34 @@ class FSOperations(object):
 	@handle_fs_errors
 	def FindFiles(self, FileName, FillFindData, DokanFileInfo):
 		FileName = self._dokanpath2pyfs(FileName)
-		for (nm, finfo) in self.fs.listdirinfo(FileName):
-			fpath = combine(FileName, nm)
-			if self._is_pending_delete(fpath):
-				continue
-			data = self._info2finddataw(fpath, finfo)
-			FillFindData(ctypes.byref(data), DokanFileInfo)
+		self._find_files(FileName, None, FillFindData, DokanFileInfo)
 		return STATUS_SUCCESS
 
 	@timeout_protect
 	@handle_fs_errors
 	def FindFilesWithPattern(self, FileName, SearchPattern, FillFindData, DokanFileInfo):
 		FileName = self._dokanpath2pyfs(FileName)
-		for nm in self.fs.listdir(FileName):
-			fpath = combine(FileName, nm)
-			finfo = self.fs.getinfo(fpath, namespaces=['basic','details'])
-			if self._is_pending_delete(fpath):
+		self._find_files(FileName, SearchPattern, FillFindData, DokanFileInfo)
+		return STATUS_SUCCESS
+
+	def _find_files(self, FileName, SearchPattern, FillFindData, DokanFileInfo):
+		"""Report the entries of a directory matching SearchPattern.
+
+		The directory is enumerated with a single scandir() call, and the
+		cheap name and pending-delete checks are done before any entry is
+		converted to a WIN32_FIND_DATAW.
+		"""
+		if self._is_pending_delete(FileName):
+			return
+		pending_delete = self._pending_delete
+		for finfo in self._fs_scandir(FileName, namespaces=['details']):
+			nm = finfo.name
+			if SearchPattern is not None and not libdokan.DokanIsNameInExpression(SearchPattern, nm, True):
 				continue
-			if not libdokan.DokanIsNameInExpression(SearchPattern, nm, True):
+			fpath = combine(FileName, nm)
+			if fpath in pending_delete:
 				continue
-			data = self._info2finddataw(fpath, finfo, None)
+			data = self._info2finddataw(fpath, finfo, leaf=nm)
 			FillFindData(ctypes.byref(data), DokanFileInfo)
 
 	@timeout_protect
@@ -714,22 +922,20 @@ class FSOperations(object):
 	@handle_fs_errors
 	def SetFileTime(self, FileName, CreationTime, LastAccessTime, LastWriteTime, DokanFileInfo):
 		FileName = self._dokanpath2pyfs(FileName)
-		# setting ctime is not supported
-		if LastAccessTime is not None:
-			try:
-				LastAccessTime = _filetime2datetime(LastAccessTime.contents)
-			except ValueError:
-				LastAccessTime = None
-		if LastWriteTime is not None:
-			try:
-				LastWriteTime = _filetime2datetime(LastWriteTime.contents)
-			except ValueError:
-				LastWriteTime = None
+		#  Only the times Dokan actually supplies are changed; a NULL or
+		#  zero FILETIME means "leave this one alone".  Setting ctime is
+		#  not supported.
+		details = {}
+		if LastAccessTime and _filetime_is_set(LastAccessTime.contents):
+			details['accessed'] = _filetime2timestamp(LastAccessTime.contents)
+		if LastWriteTime and _filetime_is_set(LastWriteTime.contents):
+			details['modified'] = _filetime2timestamp(LastWriteTime.contents)
 		#  some programs demand this succeed; fake it
-		try:
-			self.fs.settimes(FileName, LastAccessTime, LastWriteTime)
-		except Unsupported:
-			pass
+		if details:
+			try:
+				self.fs.setinfo(FileName, {'details': details})
+			except Unsupported:
+				pass
 		return STATUS_SUCCESS
 
 	@timeout_protect
@@ -737,7 +943,7 @@ class FSOperations(object):
 	def DeleteFile(self, FileName, DokanFileInfo):
 		FileName = self._dokanpath2pyfs(FileName)
 		if not self.fs.isfile(FileName):
-			if not self.fs.exists(FileName):
+			if not self._fs_exists(FileName):
 				return STATUS_ACCESS_DENIED
 			else:
 				return STATUS_OBJECT_NAME_NOT_FOUND
@@ -749,7 +955,7 @@ class FSOperations(object):
 	@handle_fs_errors
 	def DeleteDirectory(self, FileName, DokanFileInfo):
 		FileName = self._dokanpath2pyfs(FileName)
-		for nm in self.fs.listdir(FileName):
+		for nm in self._fs_listdir(FileName):
 			if not self._is_pending_delete(join(FileName, nm)):
 				return STATUS_DIRECTORY_NOT_EMPTY
 		self._pending_delete.add(FileName)
@@ -760,17 +966,19 @@ class FSOperations(object):
 	@handle_fs_errors
 	def MoveFile(self, FileName, NewFileName, overwrite, DokanFileInfo):
 		#  Close the file if we have an open handle to it.
-		if DokanFileInfo.contents.Context >= MinimumFileHandler:
-			(file, _, lock) = self._get_file(DokanFileInfo.contents.Context)
+		dfi = DokanFileInfo.contents
+		fh = dfi.Context
+		if fh >= MinimumFileHandler:
+			(file, _, lock) = self._get_file(fh)
 			lock.acquire()
 			try:
 				file.close()
-				self._del_file(DokanFileInfo.contents.Context)
+				self._del_file(fh)
 			finally:
 				lock.release()
 		FileName = self._dokanpath2pyfs(FileName)
 		NewFileName = self._dokanpath2pyfs(NewFileName)
-		if DokanFileInfo.contents.IsDirectory:
+		if dfi.IsDirectory:
 			self.fs.movedir(FileName, NewFileName, create=True)
 		else:
 			self.fs.move(FileName, NewFileName, overwrite=True)
@@ -779,8 +987,7 @@ class FSOperations(object):
 	@timeout_protect
 	@handle_fs_errors
 	def SetEndOfFile(self, FileName, AllocSize, DokanFileInfo):
-		self._dokanpath2pyfs(FileName)
-		(file, _, lock) = self._get_file(DokanFileInfo.contents.Context)
+		(file, FileName, lock) = self._get_file(DokanFileInfo.contents.Context)
 		lock.acquire()
 		try:
 			pos = file.tell()
@@ -789,6 +996,9 @@ class FSOperations(object):
 			file.truncate()
 			if pos < AllocSize:
 				file.seek(min(pos, AllocSize))
+			#  The file now ends at AllocSize, whatever was written before.
+			if FileName in self._max_size_written:
+				self._max_size_written[FileName] = AllocSize
 		finally:
 			lock.release()
 		return STATUS_SUCCESS
@@ -808,20 +1018,23 @@ class FSOperations(object):
 
 	@handle_fs_errors
 	def GetVolumeInformation(self, VolumeNameBuffer, VolumeNameSize, VolumeSerialNumber, MaximumComponentLenght, FileSystemFlags, FileSystemNameBuffer, FileSystemNameSize, DokanFileInfo):
-		nm = ctypes.create_unicode_buffer(self.volname[:VolumeNameSize - 1])
-		sz = (len(nm.value) + 1) * ctypes.sizeof(ctypes.c_wchar)
-		ctypes.memmove(VolumeNameBuffer, nm, sz)
+		self._copy_name(self._volname_buf, VolumeNameBuffer, VolumeNameSize)
 		if VolumeSerialNumber:
 			VolumeSerialNumber[0] = 0
 		if MaximumComponentLenght:
 			MaximumComponentLenght[0] = 255
 		if FileSystemFlags:
 			FileSystemFlags[0] = FILE_CASE_SENSITIVE_SEARCH | FILE_CASE_PRESERVED_NAMES | FILE_SUPPORTS_REMOTE_STORAGE | FILE_UNICODE_ON_DISK | FILE_PERSISTENT_ACLS
-		nm = ctypes.create_unicode_buffer(self.fsname[:FileSystemNameSize - 1])
-		sz = (len(nm.value) + 1) * ctypes.sizeof(ctypes.c_wchar)
-		ctypes.memmove(FileSystemNameBuffer, nm, sz)
+		self._copy_name(self._fsname_buf, FileSystemNameBuffer, FileSystemNameSize)
 		return STATUS_SUCCESS
 
+	@staticmethod
+	def _copy_name(nm, Buffer, Size):
+		"""Copy a NUL-terminated unicode buffer into one of Size characters."""
+		if len(nm) > Size:
+			nm = ctypes.create_unicode_buffer(nm.value[:Size - 1])
+		ctypes.memmove(Buffer, nm, ctypes.sizeof(nm))
+
 	@timeout_protect
 	@handle_fs_errors
 	def SetAllocationSize(self, FileName, AllocSize, DokanFileInfo):
@@ -833,6 +1046,7 @@ class FSOperations(object):
 	@timeout_protect
 	@handle_fs_errors
 	def LockFile(self, FileName, ByteOffset, Lenght, DokanFileInfo):
+		FileName = self._dokanpath2pyfs(FileName)
 		end = ByteOffset + Lenght
 		with self._files_lock:
 			try:
@@ -843,20 +1057,22 @@ class FSOperations(object):
 				status = self._check_lock(FileName, ByteOffset, Lenght, None, locks)
 				if status:
 					return status
-			locks.append((DokanFileInfo.contents.Context, ByteOffset, end))
+			bisect.insort(locks, (ByteOffset, end, DokanFileInfo.contents.Context))
 			return STATUS_SUCCESS
 
 	@timeout_protect
 	@handle_fs_errors
 	def UnlockFile(self, FileName, ByteOffset, Lenght, DokanFileInfo):
+		FileName = self._dokanpath2pyfs(FileName)
 		with self._files_lock:
 			try:
 				locks = self._active_locks[FileName]
 			except KeyError:
 				return STATUS_NOT_LOCKED
+			fh = DokanFileInfo.contents.Context
 			todel = []
-			for i, (lh, lstart, lend) in enumerate(locks):
-				if DokanFileInfo.contents.Context == lh:
+			for i, (lstart, lend, lh) in enumerate(locks):
+				if fh == lh:
 					if lstart == ByteOffset:
 						if lend == ByteOffset + Lenght:
 							todel.append(i)
@@ -864,13 +1080,15 @@ class FSOperations(object):
 				return STATUS_NOT_LOCKED
 			for i in reversed(todel):
 				del locks[i]
+			if not locks:
+				del self._active_locks[FileName]
 			return STATUS_SUCCESS
 
 	@handle_fs_errors
 	def GetFileSecurity(self, FileName, SecurityInformation, SecurityDescriptor, BufferLenght, LenghtNeeded, DokanFileInfo):
 		SecurityDescriptor = ctypes.cast(SecurityDescriptor, libdokan.PSECURITY_DESCRIPTOR)
 		FileName = self._dokanpath2pyfs(FileName)
-		if self.fs.isdir(FileName):
+		if self._fs_isdir(FileName):
 			res = libdokan.GetFileSecurity(
 				self.securityfolder,
 				ctypes.cast(SecurityInformation, libdokan.PSECURITY_INFORMATION)[0],
@@ -897,18 +1115,16 @@ class FSOperations(object):
 	def FindStreams(self, FileName, FillFindStreamData, DokanFileInfo):
 		return STATUS_NOT_IMPLEMENTED
 
-	def _dokanpath2pyfs(self, FileName):
-		FileName = FileName.replace('\\', '/')
-		return normpath(FileName)
+	_dokanpath2pyfs = staticmethod(_dokanpath2pyfs)
 
 	def _info2attrmask(self, FileName, DokanFileInfo, hinfo=None):
 		"""Convert a file/directory info dict to a win32 file attribute mask."""
 		attrs = 0
-		st_mode = DokanFileInfo.get("st_mode", None)
-		if st_mode:
-			if statinfo.S_ISDIR(st_mode):
+		is_dir = DokanFileInfo.get('basic', 'is_dir')
+		if is_dir is not None:
+			if is_dir:
 				attrs |= FILE_ATTRIBUTE_DIRECTORY
-			elif statinfo.S_ISREG(st_mode):
+			else:
 				attrs |= FILE_ATTRIBUTE_NORMAL
 		if not attrs and hinfo:
 			if hinfo.contents.IsDirectory:
@@ -916,86 +1132,101 @@ class FSOperations(object):
 			else:
 				attrs |= FILE_ATTRIBUTE_NORMAL
 		if not attrs:
-			if self.fs.isdir(FileName):
+			if self._fs_isdir(FileName):
 				attrs |= FILE_ATTRIBUTE_DIRECTORY
 			else:
 				attrs |= FILE_ATTRIBUTE_NORMAL
 		return attrs
 
-	def _info2finddataw(self, FileName, DokanFileInfo, data=None, hinfo=None):
-		"""Convert a file/directory info dict into a WIN32_FIND_DATAW struct."""
+	def _info2finddataw(self, FileName, DokanFileInfo, data=None, hinfo=None, leaf=None):
+		"""Convert a file/directory info dict into a WIN32_FIND_DATAW struct.
+
+		If the caller already knows the final path component it can pass it
+		as 'leaf' to avoid splitting FileName again.
+		"""
 		if data is None:
 			data = libdokan.WIN32_FIND_DATAW()
 		data.dwFileAttributes = self._info2attrmask(FileName, DokanFileInfo, hinfo)
-		data.ftCreationTime = _datetime2filetime(DokanFileInfo.get('details',"created", None))
-		data.ftLastAccessTime = _datetime2filetime(DokanFileInfo.get('details',"accessed", None))
-		data.ftLastWriteTime = _datetime2filetime(DokanFileInfo.get('details',"modified", None))
-		data.nFileSizeHigh = DokanFileInfo.get('details',"size", 0) >> 32
-		data.nFileSizeLow = DokanFileInfo.get('details',"size", 0) & 0xffffffff
-		data.cFileName = basename(FileName)
+		details = DokanFileInfo.raw.get('details') or {}
+		data.ftCreationTime = _datetime2filetime(details.get("created"))
+		data.ftLastAccessTime = _datetime2filetime(details.get("accessed"))
+		data.ftLastWriteTime = _datetime2filetime(details.get("modified"))
+		size = details.get("size") or 0
+		data.nFileSizeHigh = size >> 32
+		data.nFileSizeLow = size & 0xffffffff
+		data.cFileName = basename(FileName) if leaf is None else leaf
 		data.cAlternateFileName = ""
 		return data
 
 
-def _timestamp2datetime(tstamp):
-	"""Convert a unix timestamp to a datetime object."""
-	return datetime.datetime.fromtimestamp(tstamp)
+#  The FILETIME struct, bound once for the conversions below.
+_FILETIME = libdokan.FILETIME if is_available else None
+#  Shared "no time" FILETIME.  It is only ever copied into other structs,
+#  never modified, so a single instance can be handed out.
+_ZERO_FILETIME = _FILETIME(0, 0) if is_available else None
+
+
+def _timestamp2filetime(TimeStamp, _EPOCH=FILETIME_UNIX_EPOCH, _FT=_FILETIME):
+	f = _EPOCH + int(TimeStamp * 10000000)
+	return _FT(f & 0xffffffff, f >> 32)
 
 
-def _timestamp2filetime(TimeStamp):
-	f = FILETIME_UNIX_EPOCH + int(TimeStamp * 10000000)
-	return libdokan.FILETIME(f & 0xffffffff, f >> 32)
+#  FILETIME counts 100ns intervals; scale by the reciprocal rather than divide
+_INV_1E7 = 1.0 / 10000000.0
 
 
-def _filetime2timestamp(FileTime):
+def _filetime2timestamp(FileTime, _EPOCH=FILETIME_UNIX_EPOCH, _INV=_INV_1E7):
 	f = FileTime.dwLowDateTime | (FileTime.dwHighDateTime << 32)
-	return (f - FILETIME_UNIX_EPOCH) / 10000000.0
+	return (f - _EPOCH) * _INV
 
 
-def _filetime2datetime(FileTime):
-	"""Convert a FILETIME struct info datetime.datetime object."""
-	if FileTime is None:
-		return DATETIME_ZERO
-	if FileTime.dwLowDateTime == 0 and FileTime.dwHighDateTime == 0:
-		return DATETIME_ZERO
-	return _timestamp2datetime(_filetime2timestamp(FileTime))
+def _filetime_is_set(FileTime):
+	"""Check whether a FILETIME struct holds an actual time."""
+	return bool(FileTime.dwLowDateTime or FileTime.dwHighDateTime)
 
 
-def _datetime2filetime(DateTime):
-	"""Convert a FILETIME struct info datetime.datetime object."""
+def _datetime2filetime(DateTime, _ZERO=DATETIME_ZERO, _ZERO_FT=_ZERO_FILETIME, _t2f=_timestamp2filetime, _dt=datetime.datetime):
+	"""Convert a unix timestamp or datetime object into a FILETIME struct.
+
+	pyfilesystem2 reports times as unix timestamps, which are converted
+	with integer arithmetic; datetime objects are still accepted.  The
+	returned struct may be shared and must not be modified.
+	"""
 	if DateTime is None:
-		return libdokan.FILETIME(0, 0)
-	if DateTime == DATETIME_ZERO:
-		return libdokan.FILETIME(0, 0)
-	return _timestamp2filetime(DateTime)
+		return _ZERO_FT
+	if isinstance(DateTime, _dt):
+		if DateTime == _ZERO:
+			return _ZERO_FT
+		DateTime = DateTime.timestamp()
+	return _t2f(DateTime)
+
+
+_ERRNO_MAP = {
+	errno.EEXIST: STATUS_OBJECT_NAME_COLLISION,
+	errno.ENOTEMPTY: STATUS_DIRECTORY_NOT_EMPTY,
+	errno.ENOSYS: STATUS_NOT_SUPPORTED,
+	errno.EACCES: STATUS_ACCESS_DENIED,
+}
 
 
 def _errno2syserrcode(eno):
 	"""Convert an errno into a win32 system error code."""
-	if eno == errno.EEXIST:
-		return STATUS_OBJECT_NAME_COLLISION
-	if eno == errno.ENOTEMPTY:
-		return STATUS_DIRECTORY_NOT_EMPTY
-	if eno == errno.ENOSYS:
-		return STATUS_NOT_SUPPORTED
-	if eno == errno.EACCES:
-		return STATUS_ACCESS_DENIED
-	return eno
+	return _ERRNO_MAP.get(eno, eno)
 
 
+@lru_cache(maxsize=32)
 def _check_path_string(FileName):  # TODO Probably os.path has a better check for this...
 	"""Check path string."""
 	if not FileName or not FileName[0].isalpha() or not FileName[1:3] == ':\\':
 		raise ValueError("invalid path: %r" % (FileName,))
 
 
-
 def mount(fs, path, foreground=False, ready_callback=None, unmount_callback=None, **kwds):
 	"""Mount the given FS at the given path, using Dokan.
 
-	By default, this function spawns a new background process to manage the
+	By default, this function starts a new background thread to run the
 	Dokan event loop.  The return value in this case is an instance of the
-	'MountProcess' class, a subprocess.Popen subclass.
+	'MountProcess' class, a threading.Thread subclass.
 
 	If the keyword argument 'foreground' is given, we instead run the Dokan
 	main loop in the current process.  In this case the function will block
@@ -1006,7 +1237,9 @@ def mount(fs, path, foreground=False, ready_callback=None, unmount_callback=None
 	keyword arguments control the behavior of the final dokan mount point.
 	Some interesting options include:
 
-					* numthreads:  number of threads to use for handling Dokan requests
+					* numthreads:  number of threads to use for handling Dokan requests;
+					  these are created and owned by the Dokan library for the
+					  lifetime of the mount (0 lets Dokan choose)
 					* fsname:  name to display in explorer etc
 					* flags:   DOKAN_OPTIONS bitmask
 					* securityfolder:  folder path used to duplicate security rights on all folders
@@ -1021,10 +1254,10 @@ def mount(fs, path, foreground=False, ready_callback=None, unmount_callback=None
 	#  operation, it's where we call DokanMain().
 	if foreground:
 		MountProcess._mount(fs, path, ready_callback, unmount_callback, **kwds)
-	#  Running the background, spawn a subprocess and wait for it
-	#  to be ready before returning.
+	#  Running the background, start a MountProcess thread running
+	#  the main loop.
 	else:
-		mp = MountProcess(fs, path, ready_callback, unmount_callback, **kwds)
+		mp = MountProcess(fs, path, ready_callback=ready_callback, unmount_callback=unmount_callback, **kwds)
 		mp.start()
 		return mp
 
@@ -1062,29 +1295,39 @@ class MountProcess(threading.Thread):
 	#  This function captures the logic of checking whether the Dokan mount
 	#  is up and running.  Unfortunately I can't find a way to get this
 	#  via a callback in the Dokan API.  Instead we just check for the path
-	#  in a loop, polling the mount proc to make sure it hasn't died.
-	def check_alive(self, mp):
-		if mp and mp.poll() is not None:
+	#  in a loop, making sure the Dokan main loop hasn't exited meanwhile.
+	#  The mount is usually up within a few milliseconds, so the polling
+	#  interval starts small and backs off exponentially.
+	ready_timeout = 5.0
+
+	@staticmethod
+	def check_alive(stopped):
+		if stopped is not None and stopped.is_set():
 			raise OSError("dokan mount process exited prematurely")
 
-	def check_ready(self, mp=None):
-		if _ready_callback is not None:
-			check_alive(mp)
-			for _ in  six.moves.range(100):
-				try:
-					os.stat(path)
-				except EnvironmentError:
-					check_alive(mp)
-					time.sleep(0.05)
-				else:
-					check_alive(mp)
-					if _ready_callback:
-						return _ready_callback()
-					else:
-						return None
+	@staticmethod
+	def check_ready(path, ready_callback, stopped=None, timeout=None):
+		if timeout is None:
+			timeout = MountProcess.ready_timeout
+		_stat = os.stat
+		_sleep = time.sleep
+		_monotonic = time.monotonic
+		check_alive = MountProcess.check_alive
+		deadline = _monotonic() + timeout
+		delay = 0.002
+		while True:
+			check_alive(stopped)
+			try:
+				_stat(path)
+			except EnvironmentError:
+				if _monotonic() >= deadline:
+					raise OSError("dokan mount process seems to be hung")
+				_sleep(delay)
+				delay = min(delay * 1.5, 0.05)
 			else:
-				check_alive(mp)
-				raise OSError("dokan mount process seems to be hung")
+				if ready_callback:
+					return ready_callback()
+				return None
 
 	@staticmethod
 	def _mount(fs, path, ready_callback, unmount_callback, **kwds):
@@ -1093,12 +1336,16 @@ class MountProcess(threading.Thread):
 		FSOperationsClass = kwds.pop("FSOperationsClass", FSOperations)
 		opts = libdokan.DOKAN_OPTIONS(libdokan.DOKAN_MINIMUM_COMPATIBLE_VERSION, numthreads, flags, 0, path, "", 2000, 512, 512)
 		ops = FSOperationsClass(fs, **kwds)
+		stopped = threading.Event()
 		if ready_callback:
-			check_thread = threading.Thread(target=check_ready)
+			check_thread = threading.Thread(target=MountProcess.check_ready, args=(path, ready_callback, stopped))
 			check_thread.daemon = True
 			check_thread.start()
 		opstruct = ops.get_ops_struct()
-		res = libdokan.DokanMain(ctypes.byref(opts), ctypes.byref(opstruct))
+		try:
+			res = libdokan.DokanMain(ctypes.byref(opts), ctypes.byref(opstruct))
+		finally:
+			stopped.set()
 		if res != DOKAN_SUCCESS:
 			raise OSError("Dokan failed with error: " + str(res))
 		if unmount_callback:
@@ -1110,20 +1357,9 @@ class MountProcess(threading.Thread):
 		self._mount(self._pyfs, self._path, self._ready_callback, self._unmount_callback, **(self._kwds))
 
 	def unmount(self):
-		"""Cleanly unmount the Dokan filesystem, terminating this subprocess."""
+		"""Cleanly unmount the Dokan filesystem, ending this thread's main loop."""
 		if not libdokan.DokanRemoveMountPoint(self.path):
 			raise OSError("the filesystem could not be unmounted: %s" %(self.path,))
-		#self.terminate()
-
-	#if not hasattr(subprocess.Popen, "terminate"):
-	#	def terminate(self):
-	#		"""Gracefully terminate the subprocess."""
-	#		kernel32.TerminateProcess(int(self), -1)
-
-	#if not hasattr(subprocess.Popen, "kill"):
-	#	def kill(self):
-	#		"""Forcibly terminate the subprocess."""
-	#		kernel32.TerminateProcess(int(self), -1)
 
 class Win32SafetyFS(WrapFS):
 	"""FS wrapper for extra safety when mounting on win32.
@@ -1140,38 +1376,261 @@ class Win32SafetyFS(WrapFS):
 		self.allow_autorun = allow_autorun
 		super(Win32SafetyFS, self).__init__(wrapped_fs)
 
+	#  Colons and autorun files are rare, so both methods test cheaply for
+	#  them before rewriting, and only lowercase the prefix they compare.
 	def _encode(self, path):
 		path = relpath(normpath(path))
-		path = path.replace(":", "__colon__")
+		if ":" in path:
+			path = path.replace(":", "__colon__")
 		if not self.allow_autorun:
-			if path.lower().startswith("_autorun."):
+			if path[:9].lower() == "_autorun.":
 				path = path[1:]
 		return path
 
 	def _decode(self, path):
 		path = relpath(normpath(path))
-		path = path.replace("__colon__", ":")
+		if "__colon__" in path:
+			path = path.replace("__colon__", ":")
 		if not self.allow_autorun:
-			if path.lower().startswith("autorun."):
+			if path[:8].lower() == "autorun.":
 				path = "_" + path
 		return path
 
 
-if __name__ == "__main__":
-	import os.path
-	import tempfile
-	from fs.osfs import OSFS
-	from fs.memoryfs import MemoryFS
-	from shutil import rmtree
-	from six import b
-	path = tempfile.mkdtemp()
-	try:
-		#fs = OSFS(path)
-		fs = MemoryFS()
-		fs.create('test.txt')
-		fs.appendtext('test.txt', 'this is a test', encoding=u'utf-8', errors=None, newline=u'')
-		flags = DOKAN_OPTION_DEBUG | DOKAN_OPTION_STDERR | DOKAN_OPTION_REMOVABLE
-		mount(fs, "Q:\\", foreground=True, numthreads=1, flags=flags)
-		fs.close()
-	finally:
-		rmtree(path)
+def _invalidate_path(method):
+	"""CachingFS method decorator dropping the cached entries of a path.
+
+	The path is taken from the first argument of the decorated method.
+	"""
+	@wraps(method)
+	def wrapper(self, path, *args, **kwds):
+		try:
+			return method(self, path, *args, **kwds)
+		finally:
+			self._invalidate(path)
+	return wrapper
+
+
+def _invalidate_all(method):
+	"""CachingFS method decorator dropping every cached entry.
+
+	Used for operations that may affect a whole directory tree.
+	"""
+	@wraps(method)
+	def wrapper(self, *args, **kwds):
+		try:
+			return method(self, *args, **kwds)
+		finally:
+			self._invalidate()
+	return wrapper
+
+
+class CachingFS(WrapFS):
+	"""FS wrapper caching resource info and directory listings.
+
+	Explorer and most applications issue bursts of GetFileInformation and
+	FindFiles calls for every user action, each of them going through
+	getinfo/scandir on the exposed FS.  This wrapper keeps getinfo results
+	in a bounded LRU cache and directory listings and scans in dicts, all
+	for 'ttl' seconds.  Entries are dropped as soon as the path is modified
+	through the wrapper, and neither a file opened for writing nor a scan
+	of its directory is cached until all of its writable handles are
+	closed; changes made directly on the wrapped FS become visible once
+	the entries expire.
+	"""
+
+	def __init__(self, wrapped_fs, maxsize=4096, ttl=1.0):
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self._cache_lock = threading.Lock()
+		#  Maps paths to a {namespaces: (expiry, info)} dict, in LRU order
+		self._info_cache = OrderedDict()
+		#  Maps directory paths to (expiry, names)
+		self._dir_cache = {}
+		#  Maps directory paths to a {namespaces: (expiry, infos)} dict
+		self._scan_cache = {}
+		#  Maps paths to references to the files open for writing on them
+		self._writers = {}
+		super(CachingFS, self).__init__(wrapped_fs)
+
+	def _invalidate(self, path=None):
+		"""Drop the cached entries for the given path, or all of them."""
+		with self._cache_lock:
+			if path is None:
+				self._info_cache.clear()
+				self._dir_cache.clear()
+				self._scan_cache.clear()
+			else:
+				self._drop(abspath(normpath(path)))
+
+	def _drop(self, path):
+		"""Drop the entries for a normalized path and its parent listings.
+
+		Must be called with the cache lock held.
+		"""
+		parent = dirname(path)
+		self._info_cache.pop(path, None)
+		self._dir_cache.pop(path, None)
+		self._dir_cache.pop(parent, None)
+		self._scan_cache.pop(path, None)
+		self._scan_cache.pop(parent, None)
+
+	def _add_writer(self, path, file):
+		"""Stop caching the info of path until file is closed."""
+		path = abspath(normpath(path))
+		try:
+			ref = weakref.ref(file)
+		except TypeError:
+			ref = lambda: file
+		with self._cache_lock:
+			self._drop(path)
+			self._writers.setdefault(path, []).append(ref)
+
+	def _is_writing(self, path):
+		"""Check whether path has a file open for writing.
+
+		Must be called with the cache lock held.  References to closed
+		files are dropped, along with the entries cached while they were
+		open.
+		"""
+		refs = self._writers.get(path)
+		if refs is None:
+			return False
+		refs[:] = [ref for ref in refs if not getattr(ref(), "closed", True)]
+		if refs:
+			return True
+		del self._writers[path]
+		self._drop(path)
+		return False
+
+	def _is_writing_in(self, path):
+		"""Check whether a file in directory path is open for writing.
+
+		Must be called with the cache lock held.
+		"""
+		writing = False
+		for wpath in list(self._writers):
+			if dirname(wpath) == path and self._is_writing(wpath):
+				writing = True
+		return writing
+
+	def getinfo(self, path, namespaces=None):
+		path = abspath(normpath(path))
+		key = tuple(sorted(namespaces or ()))
+		now = time.time()
+		with self._cache_lock:
+			if not (self._writers and self._is_writing(path)):
+				try:
+					(expiry, info) = self._info_cache[path][key]
+				except KeyError:
+					pass
+				else:
+					if expiry > now:
+						self._info_cache.move_to_end(path)
+						return info
+		info = super(CachingFS, self).getinfo(path, namespaces)
+		with self._cache_lock:
+			if path in self._writers:
+				return info
+			try:
+				entries = self._info_cache[path]
+			except KeyError:
+				entries = self._info_cache[path] = {}
+				if len(self._info_cache) > self.maxsize:
+					self._info_cache.popitem(last=False)
+			else:
+				self._info_cache.move_to_end(path)
+			entries[key] = (now + self.ttl, info)
+		return info
+
+	def listdir(self, path):
+		path = abspath(normpath(path))
+		now = time.time()
+		with self._cache_lock:
+			try:
+				(expiry, names) = self._dir_cache[path]
+			except KeyError:
+				pass
+			else:
+				if expiry > now:
+					return list(names)
+		names = super(CachingFS, self).listdir(path)
+		with self._cache_lock:
+			if len(self._dir_cache) >= self.maxsize:
+				self._dir_cache.clear()
+			self._dir_cache[path] = (now + self.ttl, tuple(names))
+		return names
+
+	def scandir(self, path, namespaces=None, page=None):
+		if page is not None:
+			return super(CachingFS, self).scandir(path, namespaces, page)
+		path = abspath(normpath(path))
+		key = tuple(sorted(namespaces or ()))
+		now = time.time()
+		with self._cache_lock:
+			if not (self._writers and self._is_writing_in(path)):
+				try:
+					(expiry, infos) = self._scan_cache[path][key]
+				except KeyError:
+					pass
+				else:
+					if expiry > now:
+						return iter(infos)
+		infos = tuple(super(CachingFS, self).scandir(path, namespaces))
+		with self._cache_lock:
+			if not (self._writers and self._is_writing_in(path)):
+				if len(self._scan_cache) >= self.maxsize:
+					self._scan_cache.clear()
+				self._scan_cache.setdefault(path, {})[key] = (now + self.ttl, infos)
+		return iter(infos)
+
+	def exists(self, path):
+		try:
+			self.getinfo(path)
+		except ResourceNotFound:
+			return False
+		return True
+
+	def isdir(self, path):
+		try:
+			return self.getinfo(path).is_dir
+		except ResourceNotFound:
+			return False
+
+	def isfile(self, path):
+		try:
+			return not self.getinfo(path).is_dir
+		except ResourceNotFound:
+			return False
+
+	def open(self, path, mode="r", buffering=-1, **options):
+		file = super(CachingFS, self).open(path, mode, buffering, **options)
+		if Mode(mode).writing:
+			self._add_writer(path, file)
+		return file
+
+	def openbin(self, path, mode="r", buffering=-1, **options):
+		file = super(CachingFS, self).openbin(path, mode, buffering, **options)
+		if Mode(mode).writing:
+			self._add_writer(path, file)
+		return file
+
+	appendbytes = _invalidate_path(WrapFS.appendbytes)
+	appendtext = _invalidate_path(WrapFS.appendtext)
+	create = _invalidate_path(WrapFS.create)
+	makedir = _invalidate_path(WrapFS.makedir)
+	remove = _invalidate_path(WrapFS.remove)
+	setinfo = _invalidate_path(WrapFS.setinfo)
+	settimes = _invalidate_path(WrapFS.settimes)
+	touch = _invalidate_path(WrapFS.touch)
+	upload = _invalidate_path(WrapFS.upload)
+	writebytes = _invalidate_path(WrapFS.writebytes)
+	writefile = _invalidate_path(WrapFS.writefile)
+
+	copy = _invalidate_all(WrapFS.copy)
+	copydir = _invalidate_all(WrapFS.copydir)
+	makedirs = _invalidate_all(WrapFS.makedirs)
+	move = _invalidate_all(WrapFS.move)
+	movedir = _invalidate_all(WrapFS.movedir)
+	removedir = _invalidate_all(WrapFS.removedir)
+	removetree = _invalidate_all(WrapFS.removetree)
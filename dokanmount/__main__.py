@@ -0,0 +1,20 @@
+"""
+Mount a small in-memory filesystem as drive Q: with ``python -m dokanmount``.
+"""
+
+import os
+
+from fs.memoryfs import MemoryFS
+
+from dokanmount import (DOKAN_OPTION_DEBUG, DOKAN_OPTION_STDERR, CachingFS,
+                        mount)
+
+with MemoryFS() as fs:
+	fs.writebytes('test.txt', b'This is a test file')
+	#  In-memory filesystems never block, so extra Dokan threads only add
+	#  lock contention.
+	numthreads = int(os.environ.get("DOKAN_IO_THREADS", 1))
+	flags = 0
+	if os.environ.get("DOKAN_DEBUG"):
+		flags |= DOKAN_OPTION_DEBUG | DOKAN_OPTION_STDERR
+	mount(CachingFS(fs), "Q:\\", foreground=True, numthreads=numthreads, flags=flags)
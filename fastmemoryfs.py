@@ -0,0 +1,174 @@
+"""
+A MemoryFS whose files are backed by a growable bytearray.
+
+pyfilesystem's MemoryFS keeps the content of every file in an io.BytesIO.
+Dokan tends to issue a large number of small ReadFile/WriteFile callbacks at
+arbitrary offsets, so FastMemoryFS stores each file in a single growable
+bytearray and serves reads and writes through memoryview slices, overwriting
+the data in place instead of going through the BytesIO machinery.
+"""
+
+import os
+
+from fs.memoryfs import MemoryFS, _DirEntry
+
+#  Smallest capacity a file buffer is allocated with; beyond it, the capacity
+#  doubles as the file grows, so small files stay small
+MINIMUM_CAPACITY = 256
+
+
+class _BytearrayIO(object):
+	"""Minimal io.BytesIO replacement storing its content in a bytearray.
+
+	Only the subset of the BytesIO interface used by MemoryFS is provided.
+	The logical file size is tracked separately from the capacity of the
+	backing buffer, so overwrites and appends within the capacity never
+	reallocate.
+	"""
+
+	def __init__(self):
+		self._buf = bytearray()
+		self._size = 0
+		self._pos = 0
+
+	def __len__(self):
+		return self._size
+
+	def _reserve(self, size):
+		"""Grow the backing buffer so that it can hold at least size bytes."""
+		capacity = len(self._buf)
+		if size > capacity:
+			capacity = max(size, capacity * 2, MINIMUM_CAPACITY)
+			self._buf.extend(bytes(capacity - len(self._buf)))
+
+	def seek(self, pos, whence=os.SEEK_SET):
+		if whence == os.SEEK_SET:
+			if pos < 0:
+				raise ValueError("negative seek value %r" % (pos,))
+		elif whence == os.SEEK_CUR:
+			pos = max(0, self._pos + pos)
+		elif whence == os.SEEK_END:
+			pos = max(0, self._size + pos)
+		else:
+			raise ValueError("invalid whence (%r)" % (whence,))
+		self._pos = pos
+		return pos
+
+	def tell(self):
+		return self._pos
+
+	def read(self, size=None):
+		start = self._pos
+		end = self._size
+		if size is not None and size >= 0:
+			end = min(end, start + size)
+		if end <= start:
+			return b""
+		with memoryview(self._buf) as mv:
+			data = mv[start:end].tobytes()
+		self._pos = end
+		return data
+
+	def readinto(self, b):
+		start = self._pos
+		with memoryview(b) as view:
+			view = view.cast("B")
+			n = max(0, min(len(view), self._size - start))
+			if n:
+				with memoryview(self._buf) as mv:
+					view[:n] = mv[start:start + n]
+		self._pos = start + n
+		return n
+
+	def readline(self, size=None):
+		start = self._pos
+		end = self._size
+		if size is not None and size >= 0:
+			end = min(end, start + size)
+		if end <= start:
+			return b""
+		newline = self._buf.find(b"\n", start, end)
+		if newline != -1:
+			end = newline + 1
+		return self.read(end - start)
+
+	def readlines(self, hint=-1):
+		lines = []
+		total = 0
+		for line in self:
+			lines.append(line)
+			total += len(line)
+			if 0 < hint <= total:
+				break
+		return lines
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		line = self.readline()
+		if not line:
+			raise StopIteration
+		return line
+
+	next = __next__
+
+	def write(self, data):
+		with memoryview(data) as view:
+			view = view.cast("B")
+			n = len(view)
+			if not n:
+				return 0
+			start = self._pos
+			end = start + n
+			self._reserve(end)
+			with memoryview(self._buf) as mv:
+				if start > self._size:
+					#  Writing past the end leaves a hole that reads as zeros
+					mv[self._size:start] = bytes(start - self._size)
+				mv[start:end] = view
+		if end > self._size:
+			self._size = end
+		self._pos = end
+		return n
+
+	def writelines(self, lines):
+		for line in lines:
+			self.write(line)
+
+	def truncate(self, size=None):
+		if size is None:
+			size = self._pos
+		elif size < 0:
+			raise ValueError("negative size value %r" % (size,))
+		if size < self._size:
+			self._size = size
+		return size
+
+
+class _FastDirEntry(_DirEntry):
+	"""A MemoryFS directory entry storing file data in a _BytearrayIO."""
+
+	def __init__(self, resource_type, name):
+		super(_FastDirEntry, self).__init__(resource_type, name)
+		if not self.is_dir:
+			self._bytes_file = _BytearrayIO()
+
+	@property
+	def size(self):
+		with self.lock:
+			if self.is_dir:
+				return 0
+			return len(self._bytes_file)
+
+
+class FastMemoryFS(MemoryFS):
+	"""Drop-in MemoryFS replacement with bytearray-backed files.
+
+	Files opened on a FastMemoryFS behave exactly like MemoryFS files, but
+	reads and writes at arbitrary offsets are served in place from a single
+	growable buffer per file.
+	"""
+
+	def _make_dir_entry(self, resource_type, name):
+		return _FastDirEntry(resource_type, name)
@@ -1,9 +1,41 @@
 import errno
 import sys
-from functools import wraps
+from functools import lru_cache, wraps
 
 from fs.errors import *
-from fs.path import abspath, combine, iteratepath, join, normpath
+from fs.path import abspath, combine, iteratepath, normpath
+
+
+_IS_WIN32 = sys.platform == "win32"
+
+#  The errno equivalent to each FSError type.  Other FSError subclasses are
+#  resolved through their MRO on first use and then remembered here.
+_FS_ERRNO = {
+	ResourceNotFound: errno.ENOENT,
+	ResourceInvalid: errno.EINVAL,
+	PermissionDenied: errno.EACCES,
+	ResourceLocked: 32 if _IS_WIN32 else errno.EACCES,
+	DirectoryNotEmpty: errno.ENOTEMPTY,
+	DestinationExists: errno.EEXIST,
+	InsufficientStorage: errno.ENOSPC,
+	RemoteConnectionError: errno.ENETDOWN,
+	Unsupported: errno.ENOSYS,
+	FSError: errno.EFAULT,
+}
+
+
+def fserror2errno(e):
+	"""Get the errno equivalent to the given FSError."""
+	cls = type(e)
+	eno = _FS_ERRNO.get(cls)
+	if eno is None:
+		for base in cls.__mro__:
+			if base in _FS_ERRNO:
+				eno = _FS_ERRNO[cls] = _FS_ERRNO[base]
+				break
+		else:
+			eno = errno.EFAULT
+	return eno
 
 
 def convert_fs_errors(func):
@@ -12,36 +44,25 @@ def convert_fs_errors(func):
 	def wrapper(*args, **kwds):
 		try:
 			return func(*args, **kwds)
-		except ResourceNotFound as e:
-			raise OSError(errno.ENOENT, str(e))
-		except ResourceNotFound as e:
-			if sys.platform == "win32":
-				raise OSError(errno.ESRCH, str(e))
-			else:
-				raise OSError(errno.ENOENT, str(e))
-		except ResourceInvalid as e:
-			raise OSError(errno.EINVAL, str(e))
-		except PermissionDenied as e:
-			raise OSError(errno.EACCES, str(e))
-		except ResourceLocked as e:
-			if sys.platform == "win32":
-				raise WindowsError(32, str(e))
-			else:
-				raise OSError(errno.EACCES, str(e))
-		except DirectoryNotEmpty as e:
-			raise OSError(errno.ENOTEMPTY, str(e))
-		except DestinationExists as e:
-			raise OSError(errno.EEXIST, str(e))
-		except InsufficientStorage as e:
-			raise OSError(errno.ENOSPC, str(e))
-		except RemoteConnectionError as e:
-			raise OSError(errno.ENETDOWN, str(e))
-		except Unsupported as e:
-			raise OSError(errno.ENOSYS, str(e))
 		except FSError as e:
-			raise OSError(errno.EFAULT, str(e))
+			eno = fserror2errno(e)
+			if _IS_WIN32 and isinstance(e, ResourceLocked):
+				raise WindowsError(eno, str(e))
+			raise OSError(eno, str(e))
 	return wrapper
 
+
+#  dokanmount no longer uses PathMap; it is kept for external users.
+
+#  Sentinel for "no such entry" in PathMap lookups
+_MISSING = object()
+
+
+def _pathmap_key(path):
+	"""Normalize a path into a flat PathMap key."""
+	return abspath(normpath(path))
+
+
 class PathMap(object):
 	"""Dict-like object with paths for keys.
 
@@ -64,51 +85,201 @@ class PathMap(object):
 		# list all values for paths starting with "/foo/bar"
 		pm.values("/foo/bar")
 
-	Under the hood, a PathMap is a trie-like structure where each level is
-	indexed by path name component.  This allows lookups to be performed in
-	O(number of path components) while permitting efficient prefix-based
-	operations.
+	Under the hood, a small PathMap is a flat dict keyed by normalized path,
+	so that lookups cost a single hash lookup.  Once it holds more than
+	FLAT_MAX entries it switches to a TriePathMap, where each level is
+	indexed by path name component.  This keeps lookups O(number of path
+	components) while permitting efficient prefix-based operations.
 	"""
 
+	#  Maximum number of entries kept in the flat dict
+	FLAT_MAX = 4096
+
 	def __init__(self):
-		self._map = {}
+		self._flat = {}
+		self._trie = None
+
+	def _switch_to_trie(self):
+		trie = TriePathMap()
+		for (k, v) in self._flat.items():
+			trie[k] = v
+		self._trie = trie
+		self._flat = None
 
-	def __getitem__(self, path):
+	def __getitem__(self, path, _key=_pathmap_key):
 		"""Get the value stored under the given path."""
-		m = self._map
-		for name in iteratepath(path):
-			try:
-				m = m[name]
-			except KeyError:
-				raise KeyError(path)
+		if self._trie is not None:
+			return self._trie[path]
 		try:
-			return m[""]
+			return self._flat[_key(path)]
 		except KeyError:
 			raise KeyError(path)
 
-	def __contains__(self, path):
+	def __contains__(self, path, _key=_pathmap_key):
 		"""Check whether the given path has a value stored in the map."""
+		if self._trie is not None:
+			return path in self._trie
+		return _key(path) in self._flat
+
+	def __setitem__(self, path, value, _key=_pathmap_key):
+		"""Set the value stored under the given path."""
+		if self._trie is not None:
+			self._trie[path] = value
+			return
+		self._flat[_key(path)] = value
+		if len(self._flat) > self.FLAT_MAX:
+			self._switch_to_trie()
+
+	def __delitem__(self, path, _key=_pathmap_key):
+		"""Delete the value stored under the given path."""
+		if self._trie is not None:
+			del self._trie[path]
+			return
 		try:
-			self[path]
+			del self._flat[_key(path)]
 		except KeyError:
-			return False
-		else:
-			return True
+			raise KeyError(path)
+
+	def get(self, path, default=None, _key=_pathmap_key):
+		"""Get the value stored under the given path, or the given default."""
+		if self._trie is not None:
+			return self._trie.get(path, default)
+		return self._flat.get(_key(path), default)
+
+	def pop(self, path, default=None, _key=_pathmap_key):
+		"""Pop the value stored under the given path, or the given default."""
+		if self._trie is not None:
+			return self._trie.pop(path, default)
+		return self._flat.pop(_key(path), default)
+
+	def setdefault(self, path, value, _key=_pathmap_key):
+		if self._trie is not None:
+			return self._trie.setdefault(path, value)
+		value = self._flat.setdefault(_key(path), value)
+		if len(self._flat) > self.FLAT_MAX:
+			self._switch_to_trie()
+		return value
+
+	def _iterflat(self, root, _key=_pathmap_key):
+		"""Iterate over the flat (key,value) pairs beneath the given root."""
+		root = _key(root)
+		if root == "/":
+			return iter(list(self._flat.items()))
+		prefix = root + "/"
+		return iter([(k, v) for (k, v) in self._flat.items()
+			if k == root or k.startswith(prefix)])
+
+	def clear(self, root="/"):
+		"""Clear all entries beginning with the given root path."""
+		if self._trie is not None:
+			self._trie.clear(root)
+			return
+		for (k, _) in self._iterflat(root):
+			del self._flat[k]
+
+	def iterkeys(self, root="/"):
+		"""Iterate over all keys beginning with the given root path."""
+		if self._trie is not None:
+			return self._trie.iterkeys(root)
+		return (k for (k, _) in self._iterflat(root))
+
+	def __iter__(self):
+		return self.iterkeys()
+
+	def keys(self, root="/"):
+		return list(self.iterkeys(root))
+
+	def itervalues(self, root="/"):
+		"""Iterate over all values whose keys begin with the given root path."""
+		if self._trie is not None:
+			return self._trie.itervalues(root)
+		return (v for (_, v) in self._iterflat(root))
+
+	def values(self, root="/"):
+		return list(self.itervalues(root))
+
+	def iteritems(self, root="/"):
+		"""Iterate over all (key,value) pairs beginning with the given root."""
+		if self._trie is not None:
+			return self._trie.iteritems(root)
+		return self._iterflat(root)
+
+	def items(self, root="/"):
+		return list(self.iteritems(root))
+
+	def iternames(self, root="/", _key=_pathmap_key):
+		"""Iterate over all names beneath the given root path.
+
+		This is basically the equivalent of listdir() for a PathMap - it yields
+		the next level of name components beneath the given path.
+		"""
+		if self._trie is not None:
+			return self._trie.iternames(root)
+		root = _key(root)
+		start = 1 if root == "/" else len(root) + 1
+		names = {}
+		for (k, _) in self._iterflat(root):
+			nm = k[start:].split("/", 1)[0]
+			if nm:
+				names[nm] = None
+		return iter(names)
+
+	def names(self, root="/"):
+		return list(self.iternames(root))
+
+
+@lru_cache(maxsize=1024)
+def _ip_cached(path):
+	"""Memoized iteratepath(), returning the path components as a tuple."""
+	return tuple(iteratepath(path))
+
+
+class TriePathMap(object):
+	"""Trie-backed implementation of the PathMap interface.
 
-	def __setitem__(self, path, value):
+	Each level of the trie is indexed by path name component, so lookups
+	are O(number of path components) and prefix-based operations only touch
+	the relevant subtree.  PathMap switches to this once it grows large.
+	"""
+
+	def __init__(self):
+		self._map = {}
+
+	def __getitem__(self, path, _ip=_ip_cached, _M=_MISSING):
+		"""Get the value stored under the given path."""
+		m = self._map
+		for name in _ip(path):
+			m = m.get(name, _M)
+			if m is _M:
+				raise KeyError(path)
+		v = m.get("", _M)
+		if v is _M:
+			raise KeyError(path)
+		return v
+
+	def __contains__(self, path, _ip=_ip_cached, _M=_MISSING):
+		"""Check whether the given path has a value stored in the map."""
+		m = self._map
+		for name in _ip(path):
+			m = m.get(name, _M)
+			if m is _M:
+				return False
+		return "" in m
+
+	def __setitem__(self, path, value, _ip=_ip_cached):
 		"""Set the value stored under the given path."""
 		m = self._map
-		for name in iteratepath(path):
-			try:
-				m = m[name]
-			except KeyError:
-				m = m.setdefault(name, {})
+		for name in _ip(path):
+			subm = m.get(name)
+			if subm is None:
+				subm = m[name] = {}
+			m = subm
 		m[""] = value
 
 	def __delitem__(self, path):
 		"""Delete the value stored under the given path."""
 		ms = [[self._map, None]]
-		for name in iteratepath(path):
+		for name in _ip_cached(path):
 			try:
 				ms.append([ms[-1][0][name], None])
 			except KeyError:
@@ -124,17 +295,19 @@ class PathMap(object):
 				del ms[-1]
 				del ms[-1][0][ms[-1][1]]
 
-	def get(self, path, default=None):
+	def get(self, path, default=None, _ip=_ip_cached, _M=_MISSING):
 		"""Get the value stored under the given path, or the given default."""
-		try:
-			return self[path]
-		except KeyError:
-			return default
+		m = self._map
+		for name in _ip(path):
+			m = m.get(name, _M)
+			if m is _M:
+				return default
+		return m.get("", default)
 
 	def pop(self, path, default=None):
 		"""Pop the value stored under the given path, or the given default."""
 		ms = [[self._map, None]]
-		for name in iteratepath(path):
+		for name in _ip_cached(path):
 			try:
 				ms.append([ms[-1][0][name], None])
 			except KeyError:
@@ -151,41 +324,52 @@ class PathMap(object):
 				del ms[-1][0][ms[-1][1]]
 		return val
 
-	def setdefault(self, path, value):
+	def setdefault(self, path, value, _ip=_ip_cached):
 		m = self._map
-		for name in iteratepath(path):
-			try:
-				m = m[name]
-			except KeyError:
-				m = m.setdefault(name, {})
+		for name in _ip(path):
+			subm = m.get(name)
+			if subm is None:
+				subm = m[name] = {}
+			m = subm
 		return m.setdefault("", value)
 
-	def clear(self, root="/"):
+	def clear(self, root="/", _ip=_ip_cached, _M=_MISSING):
 		"""Clear all entries beginning with the given root path."""
 		m = self._map
-		for name in iteratepath(root):
-			try:
-				m = m[name]
-			except KeyError:
+		for name in _ip(root):
+			m = m.get(name, _M)
+			if m is _M:
 				return
 		m.clear()
 
-	def iterkeys(self, root="/", m=None):
-		"""Iterate over all keys beginning with the given root path."""
-		if m is None:
-			m = self._map
-			for name in iteratepath(root):
-				try:
-					m = m[name]
-				except KeyError:
-					return
-		for (nm, subm) in m.iteritems():
-			if not nm:
-				yield abspath(root)
+	def _iterentries(self, root, _ip=_ip_cached, _M=_MISSING):
+		"""Iterate over all (key,value) pairs beneath the given root.
+
+		The trie is walked depth-first with an explicit stack of item
+		iterators, yielding entries in the same order as a recursive walk.
+		"""
+		root = abspath(normpath(root))
+		m = self._map
+		for name in _ip(root):
+			m = m.get(name, _M)
+			if m is _M:
+				return
+		stack = [(root, iter(m.items()))]
+		while stack:
+			(prefix, items) = stack[-1]
+			for (nm, subm) in items:
+				if not nm:
+					yield (prefix, subm)
+				else:
+					stack.append((combine(prefix, nm), iter(subm.items())))
+					break
 			else:
-				k = combine(root, nm)
-				for subk in self.iterkeys(k, subm):
-					yield subk
+				stack.pop()
+
+	def iterkeys(self, root="/"):
+		"""Iterate over all keys beginning with the given root path."""
+		for (k, _) in self._iterentries(root):
+			yield k
 
 	def __iter__(self):
 		return self.iterkeys()
@@ -193,61 +377,33 @@ class PathMap(object):
 	def keys(self, root="/"):
 		return list(self.iterkeys(root))
 
-	def itervalues(self, root="/", m=None):
+	def itervalues(self, root="/"):
 		"""Iterate over all values whose keys begin with the given root path."""
-		root = normpath(root)
-		if m is None:
-			m = self._map
-			for name in iteratepath(root):
-				try:
-					m = m[name]
-				except KeyError:
-					return
-		for (nm, subm) in m.iteritems():
-			if not nm:
-				yield subm
-			else:
-				k = combine(root, nm)
-				for subv in self.itervalues(k, subm):
-					yield subv
+		for (_, v) in self._iterentries(root):
+			yield v
 
 	def values(self, root="/"):
 		return list(self.itervalues(root))
 
-	def iteritems(self, root="/", m=None):
+	def iteritems(self, root="/"):
 		"""Iterate over all (key,value) pairs beginning with the given root."""
-		root = normpath(root)
-		if m is None:
-			m = self._map
-			for name in iteratepath(root):
-				try:
-					m = m[name]
-				except KeyError:
-					return
-		for (nm, subm) in m.iteritems():
-			if not nm:
-				yield (abspath(normpath(root)), subm)
-			else:
-				k = combine(root, nm)
-				for (subk, subv) in self.iteritems(k, subm):
-					yield (subk, subv)
+		return self._iterentries(root)
 
 	def items(self, root="/"):
 		return list(self.iteritems(root))
 
-	def iternames(self, root="/"):
+	def iternames(self, root="/", _ip=_ip_cached, _M=_MISSING):
 		"""Iterate over all names beneath the given root path.
 
 		This is basically the equivalent of listdir() for a PathMap - it yields
 		the next level of name components beneath the given path.
 		"""
 		m = self._map
-		for name in iteratepath(root):
-			try:
-				m = m[name]
-			except KeyError:
+		for name in _ip(root):
+			m = m.get(name, _M)
+			if m is _M:
 				return
-		for (nm, subm) in m.iteritems():
+		for (nm, subm) in m.items():
 			if nm and subm:
 				yield nm
 
@@ -0,0 +1,98 @@
+"""
+Regression tests for dokanmount.CachingFS.
+
+FSOperations opens every file through fs.open(), so the cached info and
+listings must follow writes made through open() as well as openbin().
+"""
+
+import unittest
+
+from fs.memoryfs import MemoryFS
+
+from dokanmount import CachingFS
+
+
+class TestCachingFSWrites(unittest.TestCase):
+
+	def setUp(self):
+		self.fs = CachingFS(MemoryFS(), ttl=3600)
+		self.fs.makedir("dir")
+
+	def tearDown(self):
+		self.fs.close()
+
+	def _size(self, path):
+		return self.fs.getinfo(path, ["details"]).size
+
+	def test_open_new_file(self):
+		self.assertEqual(self.fs.listdir("dir"), [])
+		with self.fs.open("dir/new.txt", "wb") as f:
+			f.write(b"hello")
+		self.assertEqual(self.fs.listdir("dir"), ["new.txt"])
+		self.assertEqual(self._size("dir/new.txt"), 5)
+
+	def test_open_existing_file(self):
+		self.fs.create("dir/file.bin")
+		self.assertEqual(self._size("dir/file.bin"), 0)
+		with self.fs.open("dir/file.bin", "r+b") as f:
+			f.write(b"0123456789")
+			f.flush()
+			self.assertEqual(self._size("dir/file.bin"), 10)
+			f.truncate(4)
+			f.flush()
+			self.assertEqual(self._size("dir/file.bin"), 4)
+		self.assertEqual(self._size("dir/file.bin"), 4)
+
+	def test_openbin(self):
+		self.assertEqual(self.fs.listdir("dir"), [])
+		with self.fs.openbin("dir/raw.bin", "w") as f:
+			f.write(b"abc")
+		self.assertEqual(self.fs.listdir("dir"), ["raw.bin"])
+		self.assertEqual(self._size("dir/raw.bin"), 3)
+
+	def test_writetext(self):
+		self.fs.writetext("dir/text.txt", "abc")
+		self.assertEqual(self._size("dir/text.txt"), 3)
+		self.fs.writetext("dir/text.txt", "abcdef")
+		self.assertEqual(self._size("dir/text.txt"), 6)
+
+	def test_reads_are_cached(self):
+		self.fs.writebytes("dir/file.bin", b"abc")
+		self.assertEqual(self._size("dir/file.bin"), 3)
+		with self.fs.open("dir/file.bin", "rb") as f:
+			f.read()
+		#  A change behind the wrapper's back stays hidden until expiry
+		self.fs.delegate_fs().writebytes("dir/file.bin", b"abcdef")
+		self.assertEqual(self._size("dir/file.bin"), 3)
+
+	def _scan_sizes(self, path):
+		return {info.name: info.size for info in self.fs.scandir(path, ["details"])}
+
+	def test_scandir_is_cached(self):
+		self.fs.writebytes("dir/file.bin", b"abc")
+		self.assertEqual(self._scan_sizes("dir"), {"file.bin": 3})
+		self.fs.delegate_fs().writebytes("dir/other.bin", b"")
+		self.assertEqual(self._scan_sizes("dir"), {"file.bin": 3})
+
+	def test_scandir_follows_open(self):
+		self.assertEqual(self._scan_sizes("dir"), {})
+		with self.fs.open("dir/new.bin", "wb") as f:
+			self.assertEqual(self._scan_sizes("dir"), {"new.bin": 0})
+			f.write(b"hello")
+			f.flush()
+			self.assertEqual(self._scan_sizes("dir"), {"new.bin": 5})
+		self.assertEqual(self._scan_sizes("dir"), {"new.bin": 5})
+		self.fs.writebytes("dir/new.bin", b"hi")
+		self.assertEqual(self._scan_sizes("dir"), {"new.bin": 2})
+
+	def test_makedirs(self):
+		self.assertEqual(self.fs.listdir("/"), ["dir"])
+		self.assertEqual([i.name for i in self.fs.scandir("/")], ["dir"])
+		self.fs.makedirs("a/b/c")
+		self.assertEqual(sorted(self.fs.listdir("/")), ["a", "dir"])
+		self.assertEqual(sorted(i.name for i in self.fs.scandir("/")), ["a", "dir"])
+		self.assertEqual(self.fs.listdir("a"), ["b"])
+
+
+if __name__ == "__main__":
+	unittest.main()
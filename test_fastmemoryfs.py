@@ -0,0 +1,108 @@
+"""
+Differential tests for fastmemoryfs.
+
+_BytearrayIO replaces io.BytesIO inside FastMemoryFS, so random sequences
+of operations must leave both in the same state.  The same goes for files
+opened on a FastMemoryFS and on a plain MemoryFS.
+"""
+
+import io
+import random
+import unittest
+
+from fs.memoryfs import MemoryFS
+
+from fastmemoryfs import MINIMUM_CAPACITY, FastMemoryFS, _BytearrayIO
+
+
+def _random_ops(rnd, count=60):
+	"""Yield (name, args) tuples for a random sequence of file operations."""
+	for _ in range(count):
+		op = rnd.randrange(7)
+		if op == 0:
+			yield ("seek", (rnd.randrange(0, 3 * MINIMUM_CAPACITY),))
+		elif op == 1:
+			yield ("seek", (rnd.randrange(-64, 64), io.SEEK_CUR))
+		elif op == 2:
+			yield ("seek", (rnd.randrange(-64, 64), io.SEEK_END))
+		elif op == 3:
+			size = rnd.choice((0, 0, 1, 7, MINIMUM_CAPACITY - 1, MINIMUM_CAPACITY + 1, 3 * MINIMUM_CAPACITY))
+			yield ("write", (bytes(rnd.randrange(256) for _ in range(size)),))
+		elif op == 4:
+			yield ("read", (rnd.choice((None, -1, 0, 1, 13, MINIMUM_CAPACITY)),))
+		elif op == 5:
+			yield ("readinto", (rnd.choice((0, 1, 13, MINIMUM_CAPACITY)),))
+		else:
+			yield ("truncate", (rnd.choice((None, rnd.randrange(0, 2 * MINIMUM_CAPACITY))),))
+
+
+def _apply(f, name, args):
+	"""Apply an operation to f, returning its result or the error type."""
+	try:
+		if name == "readinto":
+			buf = bytearray(args[0])
+			n = f.readinto(buf)
+			return (n, bytes(buf[:n]))
+		if name == "write":
+			return f.write(args[0])
+		if name == "truncate":
+			return f.truncate(*(a for a in args if a is not None))
+		return getattr(f, name)(*args)
+	except (ValueError, OSError) as e:
+		return type(e)
+
+
+class TestBytearrayIO(unittest.TestCase):
+
+	def test_matches_bytesio(self):
+		rnd = random.Random(1234)
+		for trial in range(200):
+			ours, ref = _BytearrayIO(), io.BytesIO()
+			for (name, args) in _random_ops(rnd):
+				self.assertEqual(_apply(ours, name, args), _apply(ref, name, args), (trial, name, args))
+				self.assertEqual(ours.tell(), ref.tell(), (trial, name, args))
+				self.assertEqual(len(ours), len(ref.getbuffer()), (trial, name, args))
+			ours.seek(0)
+			self.assertEqual(ours.read(), ref.getvalue())
+
+	def test_readline(self):
+		data = b"one\ntwo\n\nthree"
+		ours = _BytearrayIO()
+		ours.write(data)
+		ours.seek(0)
+		self.assertEqual(ours.readlines(), io.BytesIO(data).readlines())
+		ours.seek(2)
+		self.assertEqual(ours.readline(3), b"e\n")
+
+	def test_empty_write_past_end(self):
+		ours = _BytearrayIO()
+		ours.write(b"abc")
+		ours.seek(100)
+		self.assertEqual(ours.write(b""), 0)
+		self.assertEqual(len(ours), 3)
+
+	def test_capacity_grows_geometrically(self):
+		ours = _BytearrayIO()
+		ours.write(b"x")
+		self.assertEqual(len(ours._buf), MINIMUM_CAPACITY)
+		ours.write(b"x" * MINIMUM_CAPACITY)
+		self.assertEqual(len(ours._buf), 2 * MINIMUM_CAPACITY)
+
+
+class TestFastMemoryFS(unittest.TestCase):
+
+	def test_matches_memoryfs(self):
+		rnd = random.Random(4321)
+		with FastMemoryFS() as fast, MemoryFS() as ref:
+			for trial in range(50):
+				path = "f%d.bin" % (trial,)
+				with fast.openbin(path, "w+") as ours, ref.openbin(path, "w+") as theirs:
+					for (name, args) in _random_ops(rnd):
+						self.assertEqual(_apply(ours, name, args), _apply(theirs, name, args), (trial, name, args))
+						self.assertEqual(ours.tell(), theirs.tell(), (trial, name, args))
+				self.assertEqual(fast.readbytes(path), ref.readbytes(path))
+				self.assertEqual(fast.getsize(path), ref.getsize(path))
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,78 @@
+"""
+Fixture files shared by the TestDokan scripts.
+
+Each fixture is a (path, content) pair with the content already encoded,
+so the scripts only have to write the bytes out before mounting.
+
+Larger files are generated on demand with make_file().  The filesystem
+to mount is created by open_test_fs(), which uses an in-memory FS unless
+USE_OSFS is set in the environment.
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+from functools import lru_cache
+
+from fs.path import dirname
+
+from fastmemoryfs import FastMemoryFS
+
+FIXTURES_SIMPLE = (
+	('test.txt', b'This is a test file'),
+)
+
+FIXTURES_WITH_SUBDIR = FIXTURES_SIMPLE + (
+	('TestDir/subtest.txt', b'This is a test file in a subfolder'),
+)
+
+
+@contextmanager
+def open_test_fs():
+	"""Create the filesystem exposed by the test scripts.
+
+	This is a FastMemoryFS by default.  If USE_OSFS is set, a temporary
+	directory is exposed through OSFS instead and removed afterwards.
+	"""
+	if os.environ.get("USE_OSFS"):
+		from fs.osfs import OSFS
+		with tempfile.TemporaryDirectory(prefix="pyfsdokan_") as path:
+			with OSFS(path) as fs:
+				yield fs
+	else:
+		with FastMemoryFS() as fs:
+			yield fs
+
+
+def populate(fs, fixtures):
+	"""Write the given fixtures to fs, creating parent directories as needed.
+
+	Each parent directory is created once, so a file costs a single
+	writebytes call plus at most one makedirs for its directory.
+	"""
+	created = set()
+	for (path, data) in fixtures:
+		parent = dirname(path)
+		if parent and parent not in created:
+			fs.makedirs(parent, recreate=True)
+			created.add(parent)
+		fs.writebytes(path, data)
+
+
+@lru_cache(maxsize=8)
+def _payload(size):
+	return b"\0" * size
+
+
+def make_file(fs, path, size):
+	"""Write a zero-filled file of the given size to fs in a single write.
+
+	Filesystems backed by the OS get a 1 MiB write buffer, so that the
+	payload goes out in as few system calls as possible.
+	"""
+	payload = _payload(size)
+	if fs.hassyspath(path):
+		with fs.open(path, "wb", buffering=1 << 20) as f:
+			f.write(payload)
+	else:
+		fs.writebytes(path, payload)